@@ -1,6 +1,13 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
 
-from .models import Comment, Follow, Group, Post
+from . import profiling, search
+from .models import (Comment, Follow, Group, Job, Post, ProfileRecord,
+                     UserStats)
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +16,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE по всей таблице.
+        if search_term and search.is_supported(queryset.db):
+            return search.matching(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 admin.site.register(Post, PostAdmin)
 
@@ -39,3 +52,100 @@ class FollowAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Follow, FollowAdmin)
+
+
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ("user", "posts_count", "followers_count",
+                    "following_count")
+    search_fields = ("user__username",)
+    empty_value_display = "-пусто-"
+
+
+admin.site.register(UserStats, UserStatsAdmin)
+
+
+class ProfileRecordAdmin(admin.ModelAdmin):
+    list_display = ("created", "path", "view_name", "trigger",
+                    "duration_ms", "user")
+    list_filter = ("trigger", "view_name")
+    search_fields = ("path",)
+    fields = ("created", "path", "view_name", "trigger", "duration_ms",
+              "user", "downloads", "summary")
+    readonly_fields = fields
+    empty_value_display = "-пусто-"
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        return [
+            path("<int:pk>/download/<str:kind>/",
+                 self.admin_site.admin_view(self.download),
+                 name="posts_profilerecord_download"),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        # admin_view проверяет только is_staff, права на модель — здесь.
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        record = self.get_object(request, str(pk))
+        if record is None or kind not in ("stats", "stacks"):
+            raise Http404
+        field = getattr(record, f"{kind}_file")
+        try:
+            stream = field.open("rb")
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(stream, as_attachment=True,
+                            filename=field.name.rsplit("/", 1)[-1])
+
+    def downloads(self, record):
+        return format_html(
+            '<a href="{}">cProfile (.prof)</a> · '
+            '<a href="{}">стеки для flamegraph (.collapsed)</a>',
+            reverse("admin:posts_profilerecord_download",
+                    args=[record.pk, "stats"]),
+            reverse("admin:posts_profilerecord_download",
+                    args=[record.pk, "stacks"]))
+    downloads.short_description = "Файлы"
+
+    def summary(self, record):
+        try:
+            text = profiling.summary(record)
+        except FileNotFoundError:
+            return "Файл профиля не найден"
+        return format_html("<pre>{}</pre>", text)
+    summary.short_description = "Самые дорогие функции"
+
+    def _delete_files(self, record):
+        record.stats_file.delete(save=False)
+        record.stacks_file.delete(save=False)
+
+    def delete_model(self, request, record):
+        self._delete_files(record)
+        super().delete_model(request, record)
+
+    def delete_queryset(self, request, queryset):
+        for record in queryset:
+            self._delete_files(record)
+        super().delete_queryset(request, queryset)
+
+
+admin.site.register(ProfileRecord, ProfileRecordAdmin)
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("pk", "task", "args", "status", "attempts", "run_after")
+    list_filter = ("status", "task")
+    readonly_fields = ("task", "args", "attempts", "created", "last_error")
+    actions = ("retry",)
+    empty_value_display = "-пусто-"
+
+    def retry(self, request, queryset):
+        queryset.update(status=Job.QUEUED, attempts=0,
+                        run_after=timezone.now(), locked_by="",
+                        locked_until=None)
+    retry.short_description = "Повторить выбранные задачи"
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,167 @@
+"""Замеры лент через тестовый клиент Django.
+
+Каждый сценарий — запрос к одной из страниц. Для него считаются
+задержки p50/p95, число SQL-запросов и размер ответа. Результат можно
+сохранить как базовый и сравнивать с ним следующие прогоны. Отдельно
+замеряется рендер карточек одной страницы ленты без запросов к сайту.
+"""
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.template import engines
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import thumbnails
+from .models import Follow, Group, Post, User
+
+# Допустимый рост p95 относительно базового значения. Рост меньше
+# MIN_DELTA_MS регрессией не считается: это шум измерений.
+DEFAULT_TOLERANCE = 0.5
+MIN_DELTA_MS = 5
+
+# Карточки страницы ленты: прежний цикл с include и тег post_cards
+# с карточками в кэше и без них. (имя, шаблон, чистить ли кэш)
+CARDS_INCLUDE = ('{% for post in posts %}{% include "posts/post_item.html" '
+                 'with post=post lazy=forloop.counter0 %}{% endfor %}')
+CARDS_TAG = '{% load feed_tags %}{% post_cards posts %}'
+RENDER_SCENARIOS = [
+    ('cards_include', CARDS_INCLUDE, False),
+    ('cards_tag', CARDS_TAG, False),
+    ('cards_tag_cold', CARDS_TAG, True),
+]
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу."""
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def scenarios():
+    """Адреса для замеров: (имя, url, пользователь или None)."""
+    post = Post.objects.order_by('-pk').select_related('author').first()
+    group = (Group.objects.annotate(total=Count('posts'))
+             .order_by('-total').first())
+    popular = (User.objects.annotate(total=Count('following'))
+               .order_by('-total').first())
+    reader = (User.objects.annotate(total=Count('follower'))
+              .order_by('-total').first())
+    result = [
+        ('index', reverse('index'), None),
+        ('index_deep', reverse('index') + '?page=50', None),
+    ]
+    if group is not None:
+        result.append(('group_posts', reverse('group', args=[group.slug]),
+                       None))
+    if popular is not None:
+        result.append(('profile', reverse('profile',
+                                          args=[popular.username]), None))
+    if post is not None:
+        result.append(('post_view', reverse(
+            'post', args=[post.author.username, post.pk]), None))
+    if reader is not None and Follow.objects.exists():
+        result.append(('follow_index', reverse('follow_index'), reader))
+    return result
+
+
+def measure(url, user=None, repeat=20, cold=False):
+    """Замер одного адреса; первый запрос — прогрев и в замер не входит."""
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    client.get(url)
+    timings, queries, sizes = [], [], []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} ответил {response.status_code}')
+        queries.append(len(captured))
+        sizes.append(len(response.content))
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'queries': max(queries),
+        'bytes': max(sizes),
+    }
+
+
+def run(repeat=20, cold=False, only=None):
+    return {
+        name: measure(url, user, repeat, cold)
+        for name, url, user in scenarios()
+        if not only or name in only
+    }
+
+
+def measure_render(source, context, repeat=200, cold=False):
+    """Замер рендера шаблона source; первый рендер — прогрев."""
+    template = engines['django'].from_string(source)
+    template.render(context)
+    timings = []
+    with CaptureQueriesContext(connection) as captured:
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            started = time.perf_counter()
+            html = template.render(context)
+            timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'queries': len(captured) // repeat,
+        'bytes': len(html.encode()),
+    }
+
+
+def run_render(repeat=200, only=None):
+    posts = list(Post.objects.feed()[:settings.POSTS_PER_PAGE])
+    thumbnails.resolve(posts)
+    context = {'posts': posts, 'user': None}
+    return {
+        name: measure_render(source, context, repeat, cold)
+        for name, source, cold in RENDER_SCENARIOS
+        if not only or name in only
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Список регрессий относительно базового прогона."""
+    problems = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            problems.append(f"{name}: запросов {result['queries']} "
+                            f"вместо {base['queries']}")
+        limit = max(base['p95_ms'] * (1 + tolerance),
+                    base['p95_ms'] + MIN_DELTA_MS)
+        if result['p95_ms'] > limit:
+            problems.append(f"{name}: p95 {result['p95_ms']} мс "
+                            f"больше {limit:.2f} мс")
+    return problems
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def save_baseline(results, path):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(results, stream, ensure_ascii=False, indent=2,
+                  sort_keys=True)
+        stream.write('\n')
@@ -0,0 +1,238 @@
+"""Массовая выгрузка и загрузка постов, комментариев и подписок.
+
+Данные идут потоком в формате JSON Lines или CSV: выгрузка читает базу
+через iterator(), загрузка пишет пачками bulk_create, каждую в своей
+транзакции, так что память не зависит от объёма данных. Сигналы при
+bulk_create не срабатывают, поэтому счётчики, ленты подписок, поисковый
+индекс и кэш лент пересчитываются один раз в конце загрузки
+(Importer.finish).
+"""
+import csv
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, freshness, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+
+FIELDS = {
+    'posts': ['id', 'text', 'pub_date', 'author', 'group', 'image'],
+    'comments': ['id', 'post', 'author', 'text', 'created'],
+    'follows': ['user', 'author'],
+}
+
+
+class BulkDataError(ValueError):
+    """Строки загрузки не удаётся записать в базу."""
+
+
+def export_queryset(kind):
+    if kind == 'posts':
+        return Post.objects.order_by('pk').values_list(
+            'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+            'image')
+    if kind == 'comments':
+        return Comment.objects.order_by('pk').values_list(
+            'pk', 'post_id', 'author__username', 'text', 'created')
+    return Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username')
+
+
+def export_rows(kind, chunk_size):
+    """Строки выгрузки в виде словарей, по одной."""
+    for values in export_queryset(kind).iterator(chunk_size=chunk_size):
+        row = dict(zip(FIELDS[kind], values))
+        for field in ('pub_date', 'created'):
+            if row.get(field) is not None:
+                row[field] = row[field].isoformat()
+        yield row
+
+
+def write_rows(rows, stream, fmt, fields):
+    """Пишет строки в поток; возвращает их число."""
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+        return written
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        written += 1
+    return written
+
+
+def read_rows(stream, fmt):
+    """Строки из потока; пустые значения CSV становятся None."""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value or None for key, value in row.items()}
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise BulkDataError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def _keep_dates(model, field_name):
+    # auto_now_add подменил бы дату из файла текущим временем.
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Importer:
+    """Загрузка строк одного вида пачками по batch_size."""
+
+    def __init__(self, kind, batch_size=1000, create_users=False):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.groups = None
+        self.author_ids = set()
+        self.group_ids = set()
+
+    def _user_ids(self, usernames):
+        user_ids = dict(User.objects.filter(username__in=usernames)
+                        .values_list('username', 'pk'))
+        missing = set(usernames) - set(user_ids)
+        if missing and not self.create_users:
+            raise BulkDataError(
+                'Нет пользователей: ' + ', '.join(sorted(missing)))
+        if missing:
+            User.objects.bulk_create(
+                User(username=username, password=make_password(None))
+                for username in missing)
+            user_ids.update(User.objects.filter(username__in=missing)
+                            .values_list('username', 'pk'))
+        return user_ids
+
+    def _group_id(self, slug):
+        if not slug:
+            return None
+        if self.groups is None:
+            self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        if slug not in self.groups:
+            raise BulkDataError(f'Нет группы: {slug}')
+        return self.groups[slug]
+
+    def _build_posts(self, rows):
+        users = self._user_ids({row['author'] for row in rows})
+        posts = [
+            Post(id=row.get('id'), text=row['text'],
+                 pub_date=_parse_date(row.get('pub_date')),
+                 author_id=users[row['author']],
+                 group_id=self._group_id(row.get('group')),
+                 image=row.get('image') or '')
+            for row in rows
+        ]
+        for post in posts:
+            self.author_ids.add(post.author_id)
+            if post.group_id is not None:
+                self.group_ids.add(post.group_id)
+        return posts
+
+    def _build_comments(self, rows):
+        users = self._user_ids({row['author'] for row in rows})
+        comments = [
+            Comment(id=row.get('id'), post_id=int(row['post']),
+                    author_id=users[row['author']], text=row['text'],
+                    created=_parse_date(row.get('created')))
+            for row in rows
+        ]
+        # Комментарии меняют карточки постов в их лентах.
+        scopes = (Post.objects.filter(
+            pk__in={comment.post_id for comment in comments})
+            .values_list('author_id', 'group_id').distinct())
+        for author_id, group_id in scopes:
+            self.author_ids.add(author_id)
+            if group_id is not None:
+                self.group_ids.add(group_id)
+        return comments
+
+    def _build_follows(self, rows):
+        users = self._user_ids({row[field] for row in rows
+                                for field in ('user', 'author')})
+        return [Follow(user_id=users[row['user']],
+                       author_id=users[row['author']])
+                for row in rows if row['user'] != row['author']]
+
+    def _write(self, objects):
+        # Размер одного INSERT выбирает бэкенд (у SQLite он ограничен
+        # числом параметров); batch_size задаёт размер транзакции.
+        if self.kind == 'posts':
+            with _keep_dates(Post, 'pub_date'):
+                Post.objects.bulk_create(objects)
+        elif self.kind == 'comments':
+            with _keep_dates(Comment, 'created'):
+                Comment.objects.bulk_create(objects)
+        else:
+            Follow.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def load(self, rows, progress=None):
+        """Загружает строки; возвращает их число.
+
+        progress(loaded) вызывается после каждой записанной пачки.
+        """
+        build = getattr(self, f'_build_{self.kind}')
+        rows = iter(rows)
+        loaded = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return loaded
+            try:
+                with transaction.atomic():
+                    self._write(build(batch))
+            except BulkDataError:
+                raise
+            except (IntegrityError, KeyError, ValueError) as exc:
+                raise BulkDataError(
+                    f'Строки {loaded + 1}–{loaded + len(batch)}: {exc!r}'
+                ) from exc
+            loaded += len(batch)
+            if progress is not None:
+                progress(loaded)
+
+    def finish(self):
+        """Пересчитывает всё, что обычно обновляют сигналы."""
+        models = {'posts': Post, 'comments': Comment, 'follows': Follow}
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [models[self.kind]])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        counters.reconcile()
+        if self.kind == 'posts':
+            search.index_missing()
+        if self.kind in ('posts', 'follows'):
+            timeline.rebuild()
+        scopes = [caching.ALL_POSTS]
+        scopes += [caching.author_scope(pk) for pk in self.author_ids]
+        scopes += [caching.group_scope(pk) for pk in self.group_ids]
+        caching.reset_feeds(scopes)
+        freshness.touch(scopes)
@@ -0,0 +1,303 @@
+import hashlib
+import math
+import os
+import random
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.utils.functional import cached_property
+
+from .metrics import record_cache
+
+ALL_POSTS = 'all'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    """Страница поста; кэша у неё нет, но есть время изменения."""
+    return f'post:{post_id}'
+
+
+def post_scopes(author_id, group_id):
+    """Ленты, в которые попадает пост с данными автором и группой."""
+    scopes = [ALL_POSTS, author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def count_key(scope):
+    return f'posts:count:{scope}'
+
+
+def get_feed_count(scope, count):
+    """Число постов в ленте из кэша; при промахе считает через count().
+
+    Счётчик сдвигается сигналами, но изменения в обход сигналов его не
+    трогают, поэтому срок жизни конечный: расхождение исправит пересчёт.
+    """
+    key = count_key(scope)
+    total = cache.get(key)
+    record_cache(total is not None)
+    if total is None:
+        total = count()
+        cache.set(key, total, settings.POSTS_FEED_COUNT_TIMEOUT)
+    return total
+
+
+def adjust_feed_counts(scopes, delta):
+    """Сдвигает закэшированные счётчики лент на delta.
+
+    Отсутствующие ключи не создаются: их посчитает первое чтение.
+    В файловом кэше incr переписал бы срок счётчика, и пересчёт по
+    POSTS_FEED_COUNT_TIMEOUT у активной ленты не наступал бы никогда,
+    поэтому там счётчики просто удаляются.
+    """
+    keys = [count_key(scope) for scope in scopes]
+    if _is_file_cache():
+        cache.delete_many(keys)
+        return
+    for key in keys:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+
+def generation_key(scope):
+    return f'posts:generation:{scope}'
+
+
+def _initial_generation():
+    # Поколение, потерянное при вытеснении ключа, не должно начаться
+    # заново с уже использованного значения: берём время в микросекундах.
+    return time.time_ns() // 1000
+
+
+def generation(scope):
+    """Текущее поколение ленты: часть ключа всего, что из неё закэшировано.
+
+    Пока лента не меняется, поколение постоянно и кэш живёт сколько угодно
+    долго; любое изменение постов или комментариев ленты сдвигает его.
+    """
+    key = generation_key(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial_generation(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_generations(scopes):
+    """Делает недействительным всё закэшированное для лент scopes."""
+    for scope in scopes:
+        key = generation_key(scope)
+        if _is_file_cache():
+            _bump_file_generation(key)
+            continue
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+
+
+def _bump_file_generation(key):
+    # incr файлового кэша — get и set со сроком по умолчанию без
+    # блокировки: поколение истекало бы через TIMEOUT кэша, а два
+    # одновременных сдвига давали бы одно значение.
+    lock_key = f'{key}:incr'
+    lock_timeout = settings.POSTS_CACHE_LOCK_TIMEOUT
+    while not acquire_lock(lock_key, lock_timeout):
+        time.sleep(0.001)
+    try:
+        value = cache.get(key)
+        value = _initial_generation() if value is None else value + 1
+        cache.set(key, value, None)
+    finally:
+        release_lock(lock_key)
+
+
+def reset_feeds(scopes):
+    """Сбрасывает счётчики и кэш лент после изменений в обход сигналов."""
+    cache.delete_many([count_key(scope) for scope in scopes])
+    bump_generations(scopes)
+
+
+PageKey = namedtuple('PageKey', 'key stale_key')
+
+
+def _page_key(kind, scope, token):
+    # token — номер страницы или курсор после проверки (page_token), а не
+    # сырой ?page=: иначе ?page=01 или ?page=abc плодили бы копии страниц.
+    params = f'{settings.POSTS_PAGINATION}?{token}'
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return PageKey(
+        key=f'posts:{kind}:{scope}:{generation(scope)}:{digest}',
+        # Последняя посчитанная копия страницы любого поколения.
+        stale_key=f'posts:{kind}:{scope}:latest:{digest}',
+    )
+
+
+def _should_recompute_early(delta, expires):
+    """Вероятностное досрочное обновление (XFetch).
+
+    Чем ближе срок и чем дороже пересчёт delta, тем выше шанс, что
+    очередной запрос обновит значение заранее, не дожидаясь истечения
+    срока у всех воркеров одновременно.
+    """
+    beta = settings.POSTS_CACHE_EARLY_RECOMPUTE_BETA
+    return time.time() - delta * beta * math.log(random.random()) >= expires
+
+
+def _is_file_cache():
+    return isinstance(caches['default'], FileBasedCache)
+
+
+def _lock_path(lock_key):
+    if not _is_file_cache():
+        return None
+    backend = caches['default']
+    name = hashlib.md5(backend.make_key(lock_key).encode()).hexdigest()
+    return os.path.join(backend._dir, f'{name}.lock')
+
+
+def acquire_lock(lock_key, timeout):
+    """Берёт блокировку на timeout секунд; False, если она уже занята.
+
+    В файловом кэше add — это проверка и запись двумя шагами, и два
+    воркера могут получить блокировку одновременно. Для него блокировка —
+    отдельный файл, создаваемый атомарно с O_EXCL; файл старше timeout
+    остался от упавшего воркера и снимается.
+    """
+    path = _lock_path(lock_key)
+    if path is None:
+        return cache.add(lock_key, True, timeout)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < timeout:
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def release_lock(lock_key):
+    path = _lock_path(lock_key)
+    if path is None:
+        cache.delete(lock_key)
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_or_compute(key, compute, timeout, stale_key=None):
+    """Значение из кэша; при промахе его считает только один воркер.
+
+    Остальные в это время получают устаревшую копию из stale_key, а если
+    её нет — недолго ждут результат и лишь затем считают сами.
+    """
+    lock_key = f'{key}:lock'
+    lock_timeout = settings.POSTS_CACHE_LOCK_TIMEOUT
+    entry = cache.get(key)
+    record_cache(entry is not None)
+    if entry is not None:
+        value, delta, expires = entry
+        if not _should_recompute_early(delta, expires):
+            return value
+        if not acquire_lock(lock_key, lock_timeout):
+            return value
+    elif not acquire_lock(lock_key, lock_timeout):
+        stale = cache.get(stale_key) if stale_key else None
+        if stale is not None:
+            return stale[0]
+        deadline = time.monotonic() + settings.POSTS_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return compute()
+    try:
+        started = time.monotonic()
+        value = compute()
+        entry = (value, time.monotonic() - started, time.time() + timeout)
+        cache.set(key, entry, timeout)
+        if stale_key:
+            cache.set(stale_key, entry, timeout)
+    finally:
+        release_lock(lock_key)
+    return value
+
+
+def feed_cache_key(request, scope, token):
+    """Ключ закэшированной страницы ленты или None, если не кэшируем.
+
+    Кэшируется только лента для гостей: в карточках постов автора есть
+    кнопка редактирования. token — страница из paginators.page_token.
+    """
+    if request.user.is_authenticated:
+        return None
+    return _page_key('feed', scope, token)
+
+
+def card_key(post):
+    """Ключ HTML карточки поста.
+
+    Меняется вместе с постом (version), числом комментариев и подписями
+    автора и группы, которые выводятся в карточке.
+    """
+    group = post.group
+    labels = (post.author.username, group.slug if group else '',
+              group.title if group else '')
+    digest = hashlib.md5('\n'.join(labels).encode()).hexdigest()
+    return (f'posts:card:{post.pk}:{post.version}:'
+            f'{post.comments_count}:{digest}')
+
+
+def rows_cache_key(scope, token):
+    """Ключ закэшированных постов страницы ленты — общий для всех."""
+    return _page_key('rows', scope, token)
+
+
+class CachedRows:
+    """Посты страницы, которые сначала ищутся в кэше по ключу поколения.
+
+    Выборка выполняется только при первом обращении и только при промахе.
+    """
+
+    def __init__(self, page_key, object_list):
+        self.page_key = page_key
+        self.object_list = object_list
+
+    @cached_property
+    def rows(self):
+        return get_or_compute(
+            self.page_key.key, lambda: list(self.object_list),
+            settings.POSTS_FEED_CACHE_TIMEOUT, self.page_key.stale_key)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
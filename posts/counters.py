@@ -0,0 +1,81 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарно выражениями F() из сигналов создания и
+удаления, поэтому их не нужно пересчитывать при каждом показе страницы.
+Расхождения исправляет команда manage.py reconcile_counters.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def count_user_stats(user_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def stats_for(user):
+    """Счётчики пользователя; при первом обращении они подсчитываются."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            stats = UserStats.objects.create(user=user,
+                                             **count_user_stats(user.pk))
+    except IntegrityError:
+        stats = UserStats.objects.get(user=user)
+    user.stats = stats
+    return stats
+
+
+def adjust_user_stats(user_id, **deltas):
+    # Если строки ещё нет, её подсчитает по базе первое чтение в stats_for.
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def adjust_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def _count_subquery(queryset, field):
+    counts = (queryset.filter(**{field: OuterRef('pk')}).order_by()
+              .values(field).annotate(count=Count('pk')).values('count'))
+    return Coalesce(Subquery(counts), 0)
+
+
+def reconcile():
+    """Пересчитывает все счётчики по базе.
+
+    Возвращает число исправленных строк.
+    """
+    fixed = Post.objects.exclude(
+        comments_count=_count_subquery(Comment.objects, 'post')
+    ).update(comments_count=_count_subquery(Comment.objects, 'post'))
+
+    users = User.objects.annotate(
+        real_posts=_count_subquery(Post.objects, 'author'),
+        real_followers=_count_subquery(Follow.objects, 'author'),
+        real_following=_count_subquery(Follow.objects, 'user'),
+    ).values_list('pk', 'real_posts', 'real_followers', 'real_following')
+    stats = {row.pk: row for row in UserStats.objects.all()}
+    for user_id, posts, followers, following in users.iterator():
+        real = {'posts_count': posts, 'followers_count': followers,
+                'following_count': following}
+        row = stats.get(user_id)
+        if row is None:
+            UserStats.objects.create(user_id=user_id, **real)
+            fixed += 1
+        elif any(getattr(row, field) != value
+                 for field, value in real.items()):
+            UserStats.objects.filter(pk=user_id).update(**real)
+            fixed += 1
+    return fixed
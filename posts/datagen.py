@@ -0,0 +1,128 @@
+"""Детерминированные тестовые данные для нагрузочных замеров.
+
+Одинаковые параметры и seed дают одни и те же пользователей, группы,
+посты, комментарии и подписки. Число подписчиков у авторов распределено
+по степенному закону: немногие авторы собирают большую часть подписок,
+как в настоящей соцсети. Строки пишутся через posts.bulk.Importer.
+"""
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from . import thumbnails
+from .bulk import Importer
+from .models import Group, Post
+
+WORDS = (
+    'море солнце город дорога утро вечер кот собака книга музыка друг '
+    'работа отпуск горы лес река дождь снег кофе чай поезд самолёт '
+    'фотография прогулка праздник концерт выставка парк мост улица'
+).split()
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+PERIOD = timedelta(days=365)
+IMAGE_SIZE = (1280, 720)
+
+
+def username(number):
+    return f'user{number:07d}'
+
+
+class Generator:
+    def __init__(self, users=1000, groups=20, posts=10000, comments=20000,
+                 follows=10000, images=100, seed=1, alpha=1.2,
+                 batch_size=1000):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.images = images
+        self.batch_size = batch_size
+        self.alpha = alpha
+        self.random = random.Random(seed)
+        self.first_post_id = (Post.objects.order_by('-pk')
+                              .values_list('pk', flat=True).first() or 0) + 1
+
+    def _text(self, low, high):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return ' '.join(words).capitalize()
+
+    def _date(self):
+        return START + PERIOD * self.random.random()
+
+    def _user(self):
+        return username(self.random.randrange(self.users))
+
+    def _image(self, number):
+        name = f'posts/generated_{number}.jpg'
+        if not default_storage.exists(name):
+            # Цвет от номера, а не от self.random: иначе уже созданные
+            # файлы меняли бы последовательность остальных данных.
+            color = (number * 37 % 256, number * 91 % 256, number * 53 % 256)
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.new('RGB', IMAGE_SIZE, color).save(path, 'JPEG')
+        return name
+
+    def create_groups(self):
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group-{i}',
+                  description=self._text(5, 20))
+            for i in range(self.groups)
+            if not Group.objects.filter(slug=f'group-{i}').exists())
+
+    def post_rows(self):
+        with_image = set(self.random.sample(
+            range(self.posts), min(self.images, self.posts)))
+        for i in range(self.posts):
+            group = self.random.randrange(self.groups * 2)
+            yield {
+                'id': self.first_post_id + i,
+                'text': self._text(5, 60),
+                'pub_date': self._date().isoformat(),
+                'author': self._user(),
+                # Примерно половина постов без группы.
+                'group': f'group-{group}' if group < self.groups else None,
+                'image': self._image(i) if i in with_image else None,
+            }
+
+    def comment_rows(self):
+        for _ in range(self.comments):
+            yield {
+                'post': self.first_post_id + self.random.randrange(self.posts),
+                'author': self._user(),
+                'text': self._text(3, 20),
+                'created': self._date().isoformat(),
+            }
+
+    def follow_rows(self):
+        # Вес автора с рангом r пропорционален r ** -alpha.
+        weights = list(accumulate(
+            (rank + 1) ** -self.alpha for rank in range(self.users)))
+        authors = range(self.users)
+        for _ in range(self.follows):
+            author = self.random.choices(authors, cum_weights=weights)[0]
+            yield {'user': self._user(), 'author': username(author)}
+
+    def run(self, progress=None):
+        """Создаёт все данные; progress(kind, loaded) — после каждой пачки."""
+        self.create_groups()
+        importers = {}
+        for kind, rows in (('posts', self.post_rows()),
+                           ('comments', self.comment_rows()),
+                           ('follows', self.follow_rows())):
+            importer = Importer(kind, self.batch_size, create_users=True)
+            importer.load(rows, progress and (
+                lambda loaded, kind=kind: progress(kind, loaded)))
+            importers[kind] = importer
+        # Пересчёт после постов покрывает и комментарии с подписками.
+        importers['posts'].finish()
+        # Миниатюры строятся сразу, чтобы замеры не застали их построение.
+        with_image = (Post.objects.filter(pk__gte=self.first_post_id)
+                      .exclude(image='').values_list('pk', flat=True))
+        for post_id in with_image.iterator():
+            thumbnails.generate(post_id)
@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
 from .models import Comment, Post
 
@@ -8,6 +11,14 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ["group", "text", "image"]
 
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        limit = settings.POSTS_IMAGE_MAX_UPLOAD_SIZE
+        if isinstance(image, UploadedFile) and image.size > limit:
+            raise forms.ValidationError(
+                f"Картинка больше {filesizeformat(limit)}")
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,105 @@
+"""Условные GET-запросы (ETag и Last-Modified) для лент и постов.
+
+В таблице FeedFreshness для каждой ленты и страницы поста хранится
+время последнего изменения; его обновляют те же места, что сдвигают
+поколения кэша лент. Перед view декоратор conditional одним запросом
+по первичному ключу находит время изменения страницы и, если браузер
+прислал совпадающий ETag, отвечает 304 без выборки постов и рендера.
+"""
+import hashlib
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import CharField, Max, Q, Subquery, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import caching
+from .models import FeedFreshness, Group, Post
+
+User = get_user_model()
+
+
+def touch(scopes):
+    """Отмечает ленты и страницы постов scopes как изменённые сейчас."""
+    scopes = set(scopes)
+    now = timezone.now()
+    updated = FeedFreshness.objects.filter(scope__in=scopes).update(
+        updated=now)
+    if updated < len(scopes):
+        FeedFreshness.objects.bulk_create(
+            [FeedFreshness(scope=scope, updated=now) for scope in scopes],
+            ignore_conflicts=True)
+
+
+def forget(scopes):
+    """Удаляет время изменения: страницы удалённого поста больше нет."""
+    FeedFreshness.objects.filter(scope__in=scopes).delete()
+
+
+def _scope(prefix, queryset):
+    """Ключ ленты, id которой выбирается подзапросом queryset."""
+    return Concat(Value(prefix),
+                  Cast(Subquery(queryset[:1]), CharField()),
+                  output_field=CharField())
+
+
+def index_scopes(request):
+    return [caching.ALL_POSTS]
+
+
+def group_scopes(request, slug):
+    return [_scope('group:', Group.objects.filter(slug=slug).values('pk'))]
+
+
+def profile_scopes(request, username):
+    return [_scope('author:',
+                   User.objects.filter(username=username).values('pk'))]
+
+
+def post_scopes(request, username, post_id):
+    # В шапке страницы поста — счётчики автора, они меняются вместе
+    # с его лентой.
+    return [caching.post_scope(post_id),
+            _scope('author:', Post.objects.filter(
+                pk=post_id, author__username=username).values('author_id'))]
+
+
+def last_modified(scopes):
+    """Время последнего изменения из лент scopes или None."""
+    lookup = reduce(or_, (Q(scope=scope) for scope in scopes))
+    return (FeedFreshness.objects.filter(lookup)
+            .aggregate(updated=Max('updated'))['updated'])
+
+
+def etag(request, updated):
+    # Страница зависит от пользователя (кнопки, шапка) и от токена CSRF
+    # в формах, а не только от постов.
+    parts = (updated.isoformat(), str(request.user.pk),
+             request.META.get('CSRF_COOKIE', ''), request.get_full_path(),
+             settings.POSTS_PAGINATION)
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def conditional(scopes_func):
+    """Декоратор view: 304 Not Modified для неизменившейся страницы.
+
+    scopes_func(request, *args, **kwargs) — ленты, от которых зависит
+    страница; строки или выражения. Если ни у одной нет времени
+    изменения, страница всегда отдаётся целиком.
+    """
+    def updated(request, *args, **kwargs):
+        # condition спрашивает ETag и Last-Modified по отдельности.
+        if not hasattr(request, '_freshness'):
+            request._freshness = last_modified(
+                scopes_func(request, *args, **kwargs))
+        return request._freshness
+
+    def etag_func(request, *args, **kwargs):
+        value = updated(request, *args, **kwargs)
+        return value and etag(request, value)
+
+    return condition(etag_func=etag_func, last_modified_func=updated)
@@ -0,0 +1,92 @@
+"""Приём загруженных картинок: уменьшение, перекодирование, без EXIF.
+
+Декодирование и сжатие выполняются в пуле процессов, чтобы не занимать
+потоки, которые обслуживают запросы.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from . import caching, freshness, thumbnails
+from .models import Post
+from .tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+_pool = None
+
+
+def normalize_image(source_path, target_path, max_side, image_format,
+                    quality):
+    """Сохраняет уменьшенную копию картинки; возвращает её размеры.
+
+    Выполняется в отдельном процессе, поэтому получает и возвращает
+    только простые значения.
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        # exif=b'' — метаданные снимка не переносятся в копию.
+        image.save(target_path, image_format, quality=quality,
+                   optimize=True, progressive=True, exif=b'')
+        return image.size
+
+
+def _normalize(*args):
+    if not settings.POSTS_IMAGE_PROCESSES:
+        return normalize_image(*args)
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.POSTS_IMAGE_PROCESSES)
+    return _pool.submit(normalize_image, *args).result()
+
+
+def ingest(post_id):
+    """Заменяет картинку поста нормализованной копией и строит миниатюры."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    storage = post.image.storage
+    old_name = post.image.name
+    image_format = settings.POSTS_IMAGE_FORMAT
+    stem = os.path.splitext(old_name)[0]
+    new_name = storage.get_available_name(
+        stem + EXTENSIONS[image_format])
+    try:
+        source_path = storage.path(old_name)
+        target_path = storage.path(new_name)
+    except NotImplementedError:
+        logger.warning('Хранилище %s не даёт путь к файлу, картинка '
+                       'поста %s сохранена как есть', storage, post_id)
+    else:
+        width, height = _normalize(
+            source_path, target_path, settings.POSTS_IMAGE_MAX_SIDE,
+            image_format, settings.POSTS_IMAGE_QUALITY)
+        # Картинку могли заменить, пока шла обработка.
+        updated = Post.objects.filter(pk=post.pk, image=old_name).update(
+            image=new_name, image_width=width, image_height=height,
+            version=F('version') + 1)
+        if not updated:
+            storage.delete(new_name)
+            return
+        storage.delete(old_name)
+        scopes = caching.post_scopes(post.author_id, post.group_id)
+        caching.bump_generations(scopes)
+        freshness.touch(scopes + [caching.post_scope(post.pk)])
+    thumbnails.generate(post.pk)
+
+
+def schedule(post):
+    """Ставит картинку сохранённого поста в очередь на обработку."""
+    thumbnails.reset(post)
+    if post.image:
+        run_in_background(ingest, post.pk)
@@ -0,0 +1,128 @@
+"""Очередь задач в таблице Job и воркер manage.py run_worker.
+
+Задача — вызов функции уровня модуля с аргументами, которые
+сериализуются в JSON. Запись создаётся в транзакции запроса, поэтому
+воркер увидит её только после коммита, а откат отменит и её. Воркер
+забирает задачи пачками: помечает их своим токеном и сроком аренды,
+так что несколько воркеров не выполнят одну задачу дважды, а задачи
+упавшего воркера освободятся по истечении аренды. Выполненные задачи
+удаляются; упавшие повторяются с растущей паузой, а после
+POSTS_JOB_MAX_ATTEMPTS попыток остаются со статусом failed.
+"""
+import json
+import logging
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, delay=0):
+    return Job.objects.create(
+        task=task_name(func), args=json.dumps(args),
+        run_after=timezone.now() + timedelta(seconds=delay))
+
+
+def claim(batch_size):
+    """Забирает до batch_size готовых задач и возвращает их."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    free = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ids = list(Job.objects.filter(free, status=Job.QUEUED,
+                                  run_after__lte=now)
+               .values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    # Задачу, которую между выборкой и UPDATE забрал другой воркер,
+    # условие free не пропустит.
+    Job.objects.filter(free, pk__in=ids).update(
+        locked_by=token,
+        locked_until=now + timedelta(seconds=settings.POSTS_JOB_LEASE))
+    return list(Job.objects.filter(locked_by=token))
+
+
+def retry_delay(attempts):
+    return settings.POSTS_JOB_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def execute(job):
+    """Выполняет задачу; True, если она выполнена."""
+    try:
+        func = import_string(job.task)
+        func(*json.loads(job.args))
+    except Exception:
+        job.attempts += 1
+        job.last_error = traceback.format_exc()
+        job.locked_by = ''
+        job.locked_until = None
+        if job.attempts >= settings.POSTS_JOB_MAX_ATTEMPTS:
+            job.status = Job.FAILED
+            logger.exception('Задача %s не выполнена после %s попыток',
+                             job, job.attempts)
+        else:
+            job.run_after = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts))
+            logger.warning('Задача %s упала, повтор через %s с', job,
+                           retry_delay(job.attempts), exc_info=True)
+        job.save(update_fields=['attempts', 'last_error', 'locked_by',
+                                'locked_until', 'status', 'run_after'])
+        return False
+    job.delete()
+    return True
+
+
+def _execute_in_thread(job):
+    try:
+        return execute(job)
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    def __init__(self, threads=None, batch_size=None, poll_interval=None):
+        self.threads = threads or settings.POSTS_JOB_THREADS
+        self.batch_size = batch_size or settings.POSTS_JOB_BATCH_SIZE
+        self.poll_interval = (poll_interval if poll_interval is not None
+                              else settings.POSTS_JOB_POLL_INTERVAL)
+        self.stopped = False
+
+    def run_once(self):
+        """Выполняет одну пачку задач; возвращает (выполнено, упало)."""
+        jobs = claim(self.batch_size)
+        if not jobs:
+            return 0, 0
+        if self.threads == 1:
+            results = [execute(job) for job in jobs]
+        else:
+            with ThreadPoolExecutor(
+                    max_workers=self.threads,
+                    thread_name_prefix='posts-worker') as executor:
+                results = list(executor.map(_execute_in_thread, jobs))
+        done = sum(results)
+        return done, len(results) - done
+
+    def run(self, until_empty=False):
+        while not self.stopped:
+            done, failed = self.run_once()
+            if done or failed:
+                logger.info('Выполнено задач: %s, с ошибкой: %s',
+                            done, failed)
+                continue
+            if until_empty:
+                return
+            time.sleep(self.poll_interval)
@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет ленты через тестовый клиент (или с --render '
+            'рендер карточек страницы): p50/p95, число запросов и размер '
+            'ответа; падает при регрессии относительно базового прогона')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--render', action='store_true',
+                            help='Замерить рендер карточек вместо страниц')
+        parser.add_argument('--only', nargs='*',
+                            help='Имена сценариев, например index profile')
+        parser.add_argument(
+            '--baseline',
+            help='Файл базового прогона; по умолчанию '
+                 'benchmarks/baseline.json, baseline-cold.json '
+                 'или baseline-render.json')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Записать результат как базовый')
+        parser.add_argument('--tolerance', type=float,
+                            default=benchmark.DEFAULT_TOLERANCE,
+                            help='Допустимый рост p95, доля')
+
+    def handle(self, *args, **options):
+        if options['render']:
+            results = benchmark.run_render(options['repeat'] * 10,
+                                           options['only'])
+        else:
+            results = benchmark.run(options['repeat'], options['cold'],
+                                    options['only'])
+        self.stdout.write(f'{"сценарий":<14}{"p50, мс":>10}{"p95, мс":>10}'
+                          f'{"запросов":>10}{"байт":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<14}{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                f'{result["queries"]:>10}{result["bytes"]:>10}')
+
+        if options['render']:
+            name = 'baseline-render.json'
+        elif options['cold']:
+            name = 'baseline-cold.json'
+        else:
+            name = 'baseline.json'
+        path = options['baseline'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', name)
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            benchmark.save_baseline(results, path)
+            self.stdout.write(f'Базовый прогон сохранён в {path}')
+            return
+        if not os.path.exists(path):
+            self.stdout.write('Базового прогона нет, сравнение пропущено')
+            return
+        problems = benchmark.compare(
+            results, benchmark.load_baseline(path), options['tolerance'])
+        if problems:
+            raise CommandError('Регрессия:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии или подписки в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(bulk.FIELDS))
+        parser.add_argument('--output', '-o', default='-',
+                            help='Файл; по умолчанию stdout')
+        parser.add_argument('--format', choices=bulk.FORMATS,
+                            default='jsonl')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        rows = bulk.export_rows(kind, options['chunk_size'])
+        if options['output'] == '-':
+            written = bulk.write_rows(rows, sys.stdout, options['format'],
+                                      bulk.FIELDS[kind])
+        else:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as stream:
+                written = bulk.write_rows(rows, stream, options['format'],
+                                          bulk.FIELDS[kind])
+        # Данные могут идти в stdout, поэтому итог пишется в stderr.
+        self.stderr.write(f'Выгружено строк: {written}')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from posts.datagen import Generator
+
+
+class Command(BaseCommand):
+    help = ('Создаёт детерминированные тестовые данные: пользователей, '
+            'группы, посты, комментарии и подписки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=100,
+                            help='Сколько постов получат картинку')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степени для числа подписчиков')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        generator = Generator(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], images=options['images'],
+            seed=options['seed'], alpha=options['alpha'],
+            batch_size=options['batch_size'])
+
+        def progress(kind, loaded):
+            self.stdout.write(f'{kind}: {loaded}')
+
+        generator.run(progress)
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для постов с картинкой, у которых их ещё нет'
+
+    def handle(self, *args, **options):
+        posts = (Post.objects.exclude(image='').exclude(image=None)
+                 .filter(Q(thumbnail_url='') | Q(thumbnail_srcset=''))
+                 .values_list('pk', flat=True))
+        done = 0
+        for post_id in posts.iterator():
+            thumbnails.generate(post_id)
+            done += 1
+        self.stdout.write(f'Построено миниатюр: {done}')
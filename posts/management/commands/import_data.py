@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из JSON Lines '
+            'или CSV пачками, минуя сигналы, и пересчитывает счётчики, '
+            'ленты, поиск и кэш один раз в конце')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(bulk.FIELDS))
+        parser.add_argument('input', help='Файл; «-» — stdin')
+        parser.add_argument('--format', choices=bulk.FORMATS,
+                            help='По умолчанию — по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--create-users', action='store_true',
+                            help='Создавать недостающих пользователей')
+
+    def handle(self, *args, **options):
+        path = options['input']
+        fmt = options['format'] or ('csv' if path.endswith('.csv')
+                                    else 'jsonl')
+        importer = bulk.Importer(options['kind'], options['batch_size'],
+                                 options['create_users'])
+
+        def progress(loaded):
+            self.stdout.write(f'Загружено: {loaded}')
+
+        stream = (sys.stdin if path == '-'
+                  else open(path, encoding='utf-8', newline=''))
+        try:
+            loaded = importer.load(bulk.read_rows(stream, fmt), progress)
+        except bulk.BulkDataError as exc:
+            raise CommandError(exc)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write('Пересчёт счётчиков, лент и поиска...')
+        importer.finish()
+        self.stdout.write(self.style.SUCCESS(f'Загружено строк: {loaded}'))
@@ -0,0 +1,35 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from posts.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задачи из очереди posts.Job: ленты подписчиков, '
+            'индекс поиска, картинки и миниатюры')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            help='Потоков; по умолчанию POSTS_JOB_THREADS')
+        parser.add_argument('--batch-size', type=int,
+                            help='Задач за один опрос очереди')
+        parser.add_argument('--poll-interval', type=float,
+                            help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--until-empty', action='store_true',
+                            help='Выйти, когда готовых задач не останется')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['threads'], options['batch_size'],
+                        options['poll_interval'])
+
+        def stop(signum, frame):
+            # Текущая пачка дорабатывается, новая не берётся.
+            worker.stopped = True
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            worker.run(until_empty=options['until_empty'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Воркер остановлен')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import notifications
+
+
+class Command(BaseCommand):
+    help = ('Отправляет подписчикам письма о новых постах: одно письмо '
+            'на подписчика, пачками через одно соединение')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Писем за одну отправку; по умолчанию '
+                                 'POSTS_DIGEST_BATCH_SIZE')
+        parser.add_argument('--rate', type=float,
+                            help='Не больше писем в секунду; по умолчанию '
+                                 'POSTS_DIGEST_RATE')
+
+    def handle(self, *args, **options):
+        sent = notifications.send_digests(options['batch_size'],
+                                          options['rate'])
+        self.stdout.write(f'Отправлено писем: {sent}')
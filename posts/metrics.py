@@ -0,0 +1,190 @@
+"""Метрики производительности запросов.
+
+PerformanceMiddleware заводит на время запроса RequestStats: время и
+число SQL-запросов, время рендера шаблонов, попадания и промахи кэша.
+Итоги по имени view копятся в гистограммах процесса и отдаются
+страницей /metrics/ в текстовом формате Prometheus. У каждого воркера
+свои гистограммы, скрейпер различает их по адресу воркера.
+"""
+import threading
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class RequestStats:
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+        ))
+
+
+def start():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def stop():
+    _local.stats = None
+
+
+def current():
+    """Метрики текущего запроса или None, если middleware выключен."""
+    return getattr(_local, 'stats', None)
+
+
+def record_cache(hit, count=1):
+    stats = current()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += count
+    else:
+        stats.cache_misses += count
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts = self.series.setdefault(labels,
+                                        [0] * len(self.buckets) + [0, 0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, counts in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = _labels(labels + (('le', bound),))
+                yield f'{self.name}_bucket{{{le}}} {count}'
+            le = _labels(labels + (('le', '+Inf'),))
+            yield f'{self.name}_bucket{{{le}}} {counts[-2]}'
+            yield f'{self.name}_sum{{{_labels(labels)}}} {counts[-1]}'
+            yield f'{self.name}_count{{{_labels(labels)}}} {counts[-2]}'
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{{{_labels(labels)}}} {value}'
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса',
+    TIME_BUCKETS)
+DB_DURATION = Histogram(
+    'yatube_db_duration_seconds', 'Время SQL-запросов за запрос',
+    TIME_BUCKETS)
+DB_QUERIES = Histogram(
+    'yatube_db_queries', 'Число SQL-запросов за запрос', QUERY_BUCKETS)
+TEMPLATE_DURATION = Histogram(
+    'yatube_template_duration_seconds', 'Время рендера шаблонов за запрос',
+    TIME_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total', 'Обращения к кэшу')
+METRICS = (REQUEST_DURATION, DB_DURATION, DB_QUERIES, TEMPLATE_DURATION,
+           CACHE_REQUESTS)
+
+
+def observe(view, total, stats):
+    labels = (('view', view),)
+    with _lock:
+        REQUEST_DURATION.observe(labels, total)
+        DB_DURATION.observe(labels, stats.db_time)
+        DB_QUERIES.observe(labels, stats.queries)
+        TEMPLATE_DURATION.observe(labels, stats.template_time)
+        CACHE_REQUESTS.inc(labels + (('result', 'hit'),), stats.cache_hits)
+        CACHE_REQUESTS.inc(labels + (('result', 'miss'),),
+                           stats.cache_misses)
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus."""
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.expose()]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        for metric in METRICS:
+            metric.series.clear()
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django, который учитывает время рендера.
+
+    Учитываются только шаблоны верхнего уровня: include рендерится
+    внутри них и отдельно не считается.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,79 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, profiling
+from .querylog import QueryLog
+
+
+class PerformanceMiddleware:
+    """Замеряет запрос и отдаёт итоги в заголовке Server-Timing.
+
+    Время и число SQL-запросов считаются через execute_wrapper каждого
+    соединения, время шаблонов — бэкендом posts.metrics.DjangoTemplates,
+    обращения к кэшу — помощниками posts.caching. Итоги по имени view
+    попадают в гистограммы страницы /metrics/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.start()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query))
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        total = time.perf_counter() - started
+        metrics.observe(_view_name(request), total, stats)
+        response['Server-Timing'] = stats.server_timing(total)
+        return response
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+class QueryLogMiddleware:
+    """Пишет в лог медленные и повторяющиеся SQL-запросы (posts.querylog)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = QueryLog(settings.POSTS_SLOW_QUERY_MS,
+                       settings.POSTS_DUPLICATE_QUERY_LIMIT)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(log.record_query))
+            response = self.get_response(request)
+        log.report(_view_name(request))
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос, если этого требует posts.profiling.trigger."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profiling.trigger(request)
+        if reason is None:
+            return self.get_response(request)
+        profile = profiling.Profile()
+        response = profile.run(self.get_response, request)
+        record = profile.save(request, reason)
+        # Выборочно профилируются и запросы гостей: id записи им не нужен.
+        if request.user.is_staff:
+            response['X-Profile-Id'] = str(record.pk)
+        return response
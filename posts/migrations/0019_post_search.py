@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 02:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+
+def create_search_index(apps, schema_editor):
+    # Импорт внутри функции: posts.search тянет за собой текущие модели.
+    from posts import search
+
+    search.create_index(schema_editor.connection)
+    Post = apps.get_model('posts', 'Post')
+    alias = schema_editor.connection.alias
+    search.index_posts(
+        Post.objects.using(alias).values_list('pk', 'text').iterator(),
+        alias)
+
+
+def drop_search_index(apps, schema_editor):
+    from posts import search
+
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearch',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='posts.Post')),
+                ('body', posts.models.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'posts_post_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0019_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+                ('path', models.CharField(max_length=500, verbose_name='Адрес')),
+                ('view_name', models.CharField(max_length=200, verbose_name='View')),
+                ('trigger', models.CharField(choices=[('request', 'По запросу'), ('sample', 'Выборка')], max_length=10, verbose_name='Причина')),
+                ('duration_ms', models.FloatField(verbose_name='Время, мс')),
+                ('stats_file', models.FileField(storage=posts.models.ProfileStorage(), upload_to='%Y/%m/%d/', verbose_name='cProfile')),
+                ('stacks_file', models.FileField(storage=posts.models.ProfileStorage(), upload_to='%Y/%m/%d/', verbose_name='Стеки')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'профиль запроса',
+                'verbose_name_plural': 'профили запросов',
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_freshness(apps, schema_editor):
+    # Страницы постов берут время изменения автора, поэтому хватает лент.
+    FeedFreshness = apps.get_model('posts', 'FeedFreshness')
+    Group = apps.get_model('posts', 'Group')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    alias = schema_editor.connection.alias
+    now = timezone.now()
+    scopes = ['all']
+    scopes += [f'group:{pk}' for pk in
+               Group.objects.using(alias).values_list('pk', flat=True)]
+    scopes += [f'author:{pk}' for pk in
+               User.objects.using(alias).values_list('pk', flat=True)]
+    FeedFreshness.objects.using(alias).bulk_create(
+        FeedFreshness(scope=scope, updated=now) for scope in scopes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_profile_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedFreshness',
+            fields=[
+                ('scope', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('updated', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(fill_freshness, migrations.RunPython.noop),
+    ]
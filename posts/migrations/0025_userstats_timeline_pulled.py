@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_pulled_authors(apps, schema_editor):
+    # До флага «тяжёлыми» считались авторы, у которых подписчиков больше
+    # лимита сейчас: их посты в ленты не раскладывались.
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+    author_ids = (
+        Follow.objects.values('author')
+        .annotate(followers=Count('pk'))
+        .filter(followers__gt=settings.POSTS_TIMELINE_FANOUT_LIMIT)
+        .values_list('author', flat=True)
+    )
+    for author_id in author_ids:
+        UserStats.objects.get_or_create(user_id=author_id, defaults={
+            'posts_count': Post.objects.filter(author_id=author_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=author_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=author_id).count(),
+        })
+        UserStats.objects.filter(user_id=author_id).update(
+            timeline_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='timeline_pulled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_pulled_authors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def strip_query_strings(apps, schema_editor):
+    # Строка запроса могла содержать токены сброса пароля и т. п.
+    ProfileRecord = apps.get_model('posts', 'ProfileRecord')
+    records = ProfileRecord.objects.filter(path__contains='?')
+    for record in records.only('path').iterator():
+        ProfileRecord.objects.filter(pk=record.pk).update(
+            path=record.path.split('?', 1)[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_userstats_timeline_pulled'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_query_strings, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,13 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.core.files.storage import FileSystemStorage
+from django.db import NotSupportedError, models
+from django.db.models import F
+from django.utils import timezone
+
+from . import caching
 
 User = get_user_model()
 
@@ -13,6 +21,60 @@ class Group(models.Model):
         return self.title
 
 
+class SearchDocumentField(models.TextField):
+    """Документ полнотекстового индекса.
+
+    В SQLite это колонка виртуальной таблицы FTS5 с основами слов,
+    в PostgreSQL — колонка tsvector. Колонку создаёт миграция.
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            f'Полнотекстовый поиск не поддерживается для {connection.vendor}')
+
+    def _split(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return lhs, rhs, lhs_params + rhs_params
+
+    def as_sqlite(self, compiler, connection):
+        lhs, rhs, params = self._split(compiler, connection)
+        return f'{lhs} MATCH {rhs}', params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, rhs, params = self._split(compiler, connection)
+        return f"{lhs} @@ plainto_tsquery('russian', {rhs})", params
+
+
+class PostQuerySet(models.QuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_scope = None
+
+    def count(self):
+        if self._count_scope is not None and self._result_cache is None:
+            return caching.get_feed_count(self._count_scope, super().count)
+        return super().count()
+
+    def with_cached_count(self, scope):
+        """Копия выборки, у которой count() берётся из кэша ленты scope.
+
+        Вызывается последним: дальнейшие filter()/срезы сбрасывают scope.
+        """
+        clone = self._chain()
+        clone._count_scope = scope
+        return clone
+
+    def feed(self):
+        """Посты для ленты: автор и группа в одном запросе."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст',
                             help_text='Введите текст поста')
@@ -27,13 +89,57 @@ class Post(models.Model):
     image = models.ImageField(upload_to='posts/', blank=True, null=True,
                               verbose_name='Изображение',
                               help_text='Выберите изображение')
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    thumbnail_url = models.CharField(max_length=255, blank=True,
+                                     editable=False)
+    thumbnail_width = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail_height = models.PositiveIntegerField(null=True,
+                                                   editable=False)
+    thumbnail_srcset = models.TextField(blank=True, editable=False)
+    thumbnail_placeholder = models.TextField(blank=True, editable=False)
+    # Растёт при каждом изменении поста, в том числе через update(); это
+    # часть ключа закэшированной карточки (см. posts.caching.card_key).
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta():
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # Сдвиг в самом UPDATE: при одновременных правках и update() через
+        # F() номер не повторится, как при записи посчитанного в Python.
+        self.version = F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки — чтобы при смене группы поправить
+        # счётчики обеих лент.
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -48,6 +154,10 @@ class Comment(models.Model):
 
     class Meta():
         ordering = ["-created"]
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -57,5 +167,160 @@ class Follow(models.Model):
                                related_name="following")
 
     class Meta():
-        models.UniqueConstraint(fields=['user', 'author'],
-                                name='author-user_unique')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='author-user_unique'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляются при записи."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам подписчиков, а читаются
+    # при показе ленты. Флаг не снимается, когда подписчиков становится
+    # меньше лимита: посты, опубликованные до этого, в лентах отсутствуют.
+    timeline_pulled = models.BooleanField(default=False)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+    class Meta():
+        ordering = ["-pub_date", "-post"]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='timeline_user_post_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class Notification(models.Model):
+    """Новый пост для письма-дайджеста подписчику (см. posts.notifications)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="notifications")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="+")
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta():
+        ordering = ["user", "post"]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='notification_user_post_unique'),
+        ]
+
+
+class FeedFreshness(models.Model):
+    """Время последнего изменения ленты или страницы поста.
+
+    Ключ — лента из posts.caching ('all', 'group:<id>', 'author:<id>')
+    или 'post:<id>'. По нему страницы отвечают 304 Not Modified
+    (см. posts.freshness).
+    """
+    scope = models.CharField(max_length=50, primary_key=True)
+    updated = models.DateTimeField()
+
+
+class PostSearch(models.Model):
+    """Строка полнотекстового индекса поста.
+
+    Таблица создаётся миграцией отдельно под каждую СУБД и заполняется
+    из сигналов Post (см. posts.search), поэтому модель не управляется
+    Django. Ключ — rowid, как у виртуальных таблиц SQLite.
+    """
+    post = models.OneToOneField(Post, on_delete=models.DO_NOTHING,
+                                primary_key=True, db_column='rowid',
+                                db_constraint=False,
+                                related_name='search_entry')
+    body = SearchDocumentField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_search'
+
+
+class ProfileStorage(FileSystemStorage):
+    """Файлы профилей: каталог POSTS_PROFILE_ROOT, наружу не раздаётся."""
+
+    @property
+    def base_location(self):
+        return settings.POSTS_PROFILE_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+
+class ProfileRecord(models.Model):
+    """Профиль одного запроса (см. posts.profiling)."""
+    TRIGGERS = [('request', 'По запросу'), ('sample', 'Выборка')]
+
+    created = models.DateTimeField('Дата', auto_now_add=True, db_index=True)
+    path = models.CharField('Адрес', max_length=500)
+    view_name = models.CharField('View', max_length=200)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True,
+                             blank=True, related_name='+')
+    trigger = models.CharField('Причина', max_length=10, choices=TRIGGERS)
+    duration_ms = models.FloatField('Время, мс')
+    stats_file = models.FileField('cProfile', storage=ProfileStorage(),
+                                  upload_to='%Y/%m/%d/')
+    stacks_file = models.FileField('Стеки', storage=ProfileStorage(),
+                                   upload_to='%Y/%m/%d/')
+
+    class Meta():
+        ordering = ['-created']
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'профили запросов'
+
+    def __str__(self):
+        return f'{self.path} ({self.duration_ms:.0f} мс)'
+
+
+class Job(models.Model):
+    """Отложенный вызов функции для воркера (см. posts.jobs)."""
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'В очереди'), (FAILED, 'Ошибка')]
+
+    task = models.CharField('Функция', max_length=200)
+    args = models.TextField('Аргументы', default='[]')
+    status = models.CharField('Состояние', max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta():
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='job_status_run_after_idx'),
+        ]
+        verbose_name = 'задача'
+        verbose_name_plural = 'задачи'
+
+    def __str__(self):
+        return f'{self.task}{self.args}'
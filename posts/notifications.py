@@ -0,0 +1,101 @@
+"""Письма подписчикам о новых постах.
+
+Новый пост записывается в Notification каждому подписчику автора
+с адресом почты. Команда manage.py send_digests собирает их в одно
+письмо на подписчика и отправляет пачками по
+POSTS_DIGEST_BATCH_SIZE писем через одно соединение с почтовым
+сервером (send_messages), не быстрее POSTS_DIGEST_RATE писем в секунду.
+Пост популярного автора не открывает по соединению на подписчика.
+"""
+import time
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .models import Follow, Notification, Post
+
+SUBJECT = 'Новые посты ваших подписок'
+
+
+def _insert(rows):
+    batch_size = settings.POSTS_TIMELINE_BATCH_SIZE
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        Notification.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def collect(post_id):
+    """Добавляет пост в будущие дайджесты подписчиков автора."""
+    author_id = (Post.objects.filter(pk=post_id)
+                 .values_list('author_id', flat=True).first())
+    if author_id is None:
+        return
+    followers = (Follow.objects.filter(author_id=author_id)
+                 .exclude(user__email='')
+                 .values_list('user_id', flat=True))
+    _insert(Notification(user_id=user_id, post_id=post_id)
+            for user_id in followers.iterator())
+
+
+def post_url(post):
+    return settings.POSTS_SITE_URL + reverse(
+        'post', args=[post.author.username, post.pk])
+
+
+def digest(user, posts):
+    limit = settings.POSTS_DIGEST_MAX_POSTS
+    body = render_to_string('posts/email/digest.txt', {
+        'user': user,
+        'posts': [(post, post_url(post)) for post in posts[:limit]],
+        'more': max(len(posts) - limit, 0),
+    })
+    return EmailMessage(SUBJECT, body, to=[user.email])
+
+
+def _pending_batch(batch_size):
+    """Уведомления первых batch_size подписчиков, у которых они есть."""
+    user_ids = list(Notification.objects.order_by('user_id')
+                    .values_list('user_id', flat=True)
+                    .distinct()[:batch_size])
+    return list(Notification.objects.filter(user_id__in=user_ids)
+                .select_related('user', 'post__author')
+                .order_by('user_id', '-post__pub_date'))
+
+
+def send_digests(batch_size=None, rate=None, connection=None):
+    """Отправляет все накопленные дайджесты; возвращает число писем.
+
+    Письма уходят пачками через одно соединение. Уведомления пачки
+    удаляются только после её отправки: при ошибке сервера они
+    отправятся при следующем запуске.
+    """
+    batch_size = batch_size or settings.POSTS_DIGEST_BATCH_SIZE
+    rate = settings.POSTS_DIGEST_RATE if rate is None else rate
+    connection = connection or get_connection()
+    sent = 0
+    next_batch_at = 0
+    with connection:
+        while True:
+            notifications = _pending_batch(batch_size)
+            if not notifications:
+                return sent
+            messages = [
+                digest(user, [item.post for item in items])
+                for user, items in groupby(notifications,
+                                           key=lambda item: item.user)
+            ]
+            pause = next_batch_at - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            connection.send_messages(messages)
+            if rate:
+                next_batch_at = time.monotonic() + len(messages) / rate
+            Notification.objects.filter(
+                pk__in=[item.pk for item in notifications]).delete()
+            sent += len(messages)
@@ -0,0 +1,206 @@
+import base64
+import binascii
+import math
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import DateField, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .caching import CachedRows, get_or_compute, rows_cache_key
+
+
+def encode_cursor(value, pk):
+    """Курсор из значения поля сортировки (дата или число) и id."""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = f'{value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, is_date=True):
+    """Возвращает пару (значение, pk) или None для битого курсора.
+
+    Значение — дата, если лента отсортирована по дате (is_date), иначе
+    конечное число. Курсор другого типа считается битым.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        pk = int(pk)
+        if is_date:
+            value = parse_datetime(value)
+        else:
+            value = float(value)
+            if not math.isfinite(value):
+                return None
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class KeysetPage:
+    """Страница курсорной ленты.
+
+    Выборка выполняется при первом обращении к постам, поэтому страница,
+    отданная из кэша фрагментов, не делает запросов.
+    """
+    is_keyset = True
+
+    def __init__(self, paginator, after=None, before=None, cache_key=None):
+        self.paginator = paginator
+        self.after = after
+        self.before = before
+        self.cache_key = cache_key
+
+    @cached_property
+    def _window(self):
+        if self.cache_key is None:
+            return self.paginator.fetch(self.after, self.before)
+        return get_or_compute(
+            self.cache_key.key,
+            lambda: self.paginator.fetch(self.after, self.before),
+            settings.POSTS_FEED_CACHE_TIMEOUT, self.cache_key.stale_key)
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._window[1]
+
+    def has_previous(self):
+        return self._window[2]
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.cursor(self.object_list[0])
+
+
+class KeysetPaginator:
+    """Постраничный вывод по курсору (дата, id).
+
+    В отличие от Paginator не считает COUNT(*) и не использует OFFSET,
+    поэтому стоимость страницы не зависит от её глубины. Поля курсора
+    берутся из сортировки выборки: по умолчанию это (pub_date, id),
+    в поиске — (score, id).
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        ordering = (object_list.query.order_by
+                    or object_list.model._meta.ordering)
+        self.date_field, self.id_field = (
+            field.lstrip('-') for field in ordering)
+        query = object_list.query
+        if self.date_field in query.annotations:
+            field = query.annotations[self.date_field].output_field
+        else:
+            field = object_list.model._meta.get_field(self.date_field)
+        self.is_date = isinstance(field, DateField)
+
+    def cursor(self, obj):
+        return encode_cursor(getattr(obj, self.date_field),
+                             getattr(obj, self.id_field))
+
+    def _after(self, pub_date, pk):
+        return (Q(**{f'{self.date_field}__lt': pub_date})
+                | Q(**{self.date_field: pub_date,
+                       f'{self.id_field}__lt': pk}))
+
+    def _before(self, pub_date, pk):
+        return (Q(**{f'{self.date_field}__gt': pub_date})
+                | Q(**{self.date_field: pub_date,
+                       f'{self.id_field}__gt': pk}))
+
+    def get_page(self, after=None, before=None):
+        return KeysetPage(self, after=decode_cursor(after, self.is_date),
+                          before=decode_cursor(before, self.is_date))
+
+    def fetch(self, after=None, before=None):
+        """Возвращает (посты, есть ли следующая, есть ли предыдущая)."""
+        if before is not None:
+            rows = list(self.object_list.filter(self._before(*before))
+                        .order_by(self.date_field, self.id_field)
+                        [:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return rows, True, has_previous
+
+        queryset = self.object_list.order_by(f'-{self.date_field}',
+                                             f'-{self.id_field}')
+        if after is not None:
+            queryset = queryset.filter(self._after(*after))
+        rows = list(queryset[:self.per_page + 1])
+        return (rows[:self.per_page], len(rows) > self.per_page,
+                after is not None)
+
+
+def page_token(page):
+    """Страница ленты для ключа кэша: номер или курсор после проверки.
+
+    Разные записи одной страницы (?page=01, ?page=abc, битый курсор)
+    дают один и тот же токен.
+    """
+    if getattr(page, 'is_keyset', False):
+        if page.before is not None:
+            return f'before={encode_cursor(*page.before)}'
+        if page.after is not None:
+            return f'after={encode_cursor(*page.after)}'
+        return ''
+    return f'page={page.number}'
+
+
+def paginate(request, post_list, scope=None):
+    """Возвращает (paginator, page) для ленты постов.
+
+    Курсорный режим включается настройкой POSTS_PAGINATION = 'keyset'
+    или параметрами ?after= / ?before= в запросе. Со scope посты
+    страницы берутся из кэша, пока не сменится поколение ленты.
+    """
+    per_page = settings.POSTS_PER_PAGE
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if settings.POSTS_PAGINATION == 'keyset' or after or before:
+        paginator = KeysetPaginator(post_list, per_page)
+        page = paginator.get_page(after=after, before=before)
+        if scope is not None:
+            page.cache_key = rows_cache_key(scope, page_token(page))
+        return paginator, page
+    paginator = Paginator(post_list, per_page)
+    page = paginator.get_page(request.GET.get('page'))
+    if scope is not None:
+        page.object_list = CachedRows(rows_cache_key(scope, page_token(page)),
+                                      page.object_list)
+    return paginator, page
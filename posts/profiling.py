@@ -0,0 +1,125 @@
+"""Профилирование живых запросов.
+
+Запрос профилируется, если сотрудник передал ?profile=1 или заголовок
+X-Profile: 1, либо если он попал в случайную выборку с долей
+POSTS_PROFILE_SAMPLE_RATE. View и рендер шаблонов выполняются под
+cProfile, а отдельный поток раз в POSTS_PROFILE_INTERVAL секунд снимает
+стек потока запроса. Результат — файл pstats для snakeviz и стеки в
+свёрнутом формате для flamegraph.pl и speedscope — сохраняется в
+ProfileRecord и смотрится в админке.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import ProfileRecord
+
+FLAG = 'profile'
+HEADER = 'HTTP_X_PROFILE'
+
+
+def trigger(request):
+    """Причина профилировать запрос или None."""
+    requested = (request.GET.get(FLAG) == '1'
+                 or request.META.get(HEADER) == '1')
+    if requested and request.user.is_staff:
+        return 'request'
+    rate = settings.POSTS_PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', os.path.basename(
+        code.co_filename))
+    return f'{module}:{code.co_name}'
+
+
+class Sampler(threading.Thread):
+    """Снимает стек потока thread_id, пока не вызван stop()."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='posts-profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self):
+        """Стеки в формате «кадр;кадр;… число» по строке на стек."""
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in sorted(self.stacks.items()))
+
+
+class Profile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.sampler = Sampler(threading.get_ident(),
+                               settings.POSTS_PROFILE_INTERVAL)
+        self.duration = 0.0
+
+    def run(self, func, *args):
+        self.sampler.start()
+        started = time.perf_counter()
+        try:
+            return self.profiler.runcall(func, *args)
+        finally:
+            self.duration = time.perf_counter() - started
+            self.sampler.stop()
+
+    def stats_data(self):
+        # То же, что пишет cProfile.Profile.dump_stats.
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+    def save(self, request, reason):
+        match = getattr(request, 'resolver_match', None)
+        user = request.user if request.user.is_authenticated else None
+        name = f'{int(time.time() * 1000)}-{os.getpid()}'
+        record = ProfileRecord(
+            # Без строки запроса: в ней бывают токены и другие секреты.
+            path=request.path[:500],
+            view_name=match.view_name if match else 'unresolved',
+            user=user, trigger=reason,
+            duration_ms=round(self.duration * 1000, 2))
+        record.stats_file.save(f'{name}.prof',
+                               ContentFile(self.stats_data()), save=False)
+        record.stacks_file.save(
+            f'{name}.collapsed',
+            ContentFile(self.sampler.collapsed().encode()), save=False)
+        record.save()
+        return record
+
+
+def summary(record, limit=40):
+    """Самые дорогие функции профиля по суммарному времени."""
+    stream = io.StringIO()
+    stats = pstats.Stats(record.stats_file.path, stream=stream)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
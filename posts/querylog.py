@@ -0,0 +1,129 @@
+"""Поиск медленных и повторяющихся SQL-запросов в рабочем режиме.
+
+QueryLogMiddleware через execute_wrapper записывает запросы одного
+запроса к сайту. По окончании в лог posts.querylog пишутся запросы
+дольше POSTS_SLOW_QUERY_MS и шаблоны запросов, повторившиеся не меньше
+POSTS_DUPLICATE_QUERY_LIMIT раз: так выглядит N+1, когда шаблон
+обращается к связи в цикле. Для каждого указывается view, строка кода
+проекта и строка шаблона, откуда пришёл запрос. JsonFormatter пишет
+записи лога одной строкой JSON.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SAVEPOINTS = re.compile(r'"s\d+_x\d+"')
+_IN_LISTS = re.compile(r'IN \((?:(?:%s|\?), )*(?:%s|\?)\)')
+
+# Обёртки вокруг запроса и рендера: источником запроса они не бывают.
+_WRAPPERS = {os.path.join(os.path.dirname(__file__), name)
+             for name in ('querylog.py', 'metrics.py', 'middleware.py')}
+
+
+def fingerprint(sql):
+    """Запрос без литералов: запросы, отличающиеся значениями, совпадут."""
+    sql = _SAVEPOINTS.sub('"s?"', sql)
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('IN (...)', sql)
+
+
+def _is_project_file(filename):
+    return (filename.startswith(str(settings.BASE_DIR))
+            and 'site-packages' not in filename
+            and filename not in _WRAPPERS)
+
+
+def origin():
+    """Откуда пришёл запрос: (строка кода проекта, строка шаблона).
+
+    Код — ближайший к запросу кадр из файлов проекта, шаблон — узел,
+    который рендерился в этот момент. Любое из значений может быть None.
+    """
+    code = template = None
+    frame = sys._getframe(1)
+    while frame is not None and (code is None or template is None):
+        filename = frame.f_code.co_filename
+        if code is None and _is_project_file(filename):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            code = f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            node_origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if node_origin is not None and token is not None:
+                name = node_origin.template_name or node_origin.name
+                template = f'{name}:{token.lineno}'
+        frame = frame.f_back
+    return code, template
+
+
+class QueryLog:
+    """SQL-запросы одного запроса к сайту."""
+
+    def __init__(self, slow_ms, duplicate_limit):
+        self.slow_ms = slow_ms
+        self.duplicate_limit = duplicate_limit
+        self.slow = []
+        self.counts = {}
+        self.origins = {}
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            key = fingerprint(sql)
+            count = self.counts[key] = self.counts.get(key, 0) + 1
+            # Стек разбирается только там, где он попадёт в лог:
+            # у медленных запросов и у второго повтора шаблона.
+            if duration >= self.slow_ms:
+                self.slow.append((key, duration, origin()))
+            elif count == 2:
+                self.origins[key] = origin()
+
+    def duplicates(self):
+        return [(key, count) for key, count in self.counts.items()
+                if count >= self.duplicate_limit]
+
+    def report(self, view):
+        for sql, duration, (code, template) in self.slow:
+            logger.warning('Медленный SQL-запрос', extra={
+                'event': 'slow_query', 'view': view, 'sql': sql,
+                'duration_ms': round(duration, 2),
+                'origin': code, 'template': template})
+        for sql, count in self.duplicates():
+            code, template = self.origins.get(sql, (None, None))
+            logger.warning('Повторяющийся SQL-запрос', extra={
+                'event': 'duplicate_query', 'view': view, 'sql': sql,
+                'count': count, 'origin': code, 'template': template})
+
+
+# Атрибуты, которые есть у любой записи лога; остальные пришли в extra.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной строкой JSON вместе с полями из extra."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items()
+                    if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,147 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — таблица posts_post_search: в SQLite виртуальная таблица FTS5
+с основами слов (русский стеммер из posts.stemmer), в PostgreSQL —
+колонка tsvector с GIN-индексом и словарём russian. Индекс обновляется
+из сигналов Post. Для остальных СУБД поиск не поддерживается.
+"""
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .stemmer import stems
+
+TABLE = 'posts_post_search'
+BATCH_SIZE = 500
+VENDORS = ('sqlite', 'postgresql')
+
+SQLITE_CREATE = [
+    f'CREATE VIRTUAL TABLE {TABLE} USING fts5(body)',
+]
+POSTGRESQL_CREATE = [
+    f'CREATE TABLE {TABLE} ('
+    f'rowid integer PRIMARY KEY REFERENCES posts_post (id) '
+    f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    f'body tsvector NOT NULL)',
+    f'CREATE INDEX {TABLE}_body_idx ON {TABLE} USING GIN (body)',
+]
+
+
+def is_supported(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor in VENDORS
+
+
+def create_index(connection):
+    """Создаёт таблицу индекса; вызывается из миграции."""
+    statements = {'sqlite': SQLITE_CREATE,
+                  'postgresql': POSTGRESQL_CREATE}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_index(connection):
+    if connection.vendor in VENDORS:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def document(text):
+    """Текст поста в виде, в котором он лежит в индексе SQLite."""
+    return ' '.join(stems(text))
+
+
+def fts_query(query):
+    """Запрос FTS5: все основы слов запроса, каждая в кавычках."""
+    return ' '.join(f'"{stem}"' for stem in stems(query))
+
+
+def index_posts(rows, using=DEFAULT_DB_ALIAS):
+    """Записывает в индекс пары (id поста, текст) пачками."""
+    connection = connections[using]
+    if connection.vendor not in VENDORS:
+        return
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return
+            if connection.vendor == 'sqlite':
+                cursor.executemany(
+                    f'DELETE FROM {TABLE} WHERE rowid = %s',
+                    [(pk,) for pk, _ in batch])
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, body) VALUES (%s, %s)',
+                    [(pk, document(text)) for pk, text in batch])
+            else:
+                cursor.executemany(
+                    f"INSERT INTO {TABLE} (rowid, body) "
+                    f"VALUES (%s, to_tsvector('russian', %s)) "
+                    f"ON CONFLICT (rowid) DO UPDATE SET body = EXCLUDED.body",
+                    batch)
+
+
+def index_post(post_id):
+    index_posts(Post.objects.filter(pk=post_id).values_list('pk', 'text'))
+
+
+def remove_post(post_id, using=DEFAULT_DB_ALIAS):
+    if is_supported(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                           [post_id])
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Перестраивает индекс по всем постам."""
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    index_posts(Post.objects.using(using).order_by()
+                .values_list('pk', 'text').iterator(), using)
+
+
+def index_missing(using=DEFAULT_DB_ALIAS):
+    """Добавляет в индекс посты, которых в нём нет (после bulk_create)."""
+    if not is_supported(using):
+        return
+    index_posts(Post.objects.using(using).order_by()
+                .filter(search_entry__isnull=True)
+                .values_list('pk', 'text').iterator(), using)
+
+
+def matching(queryset, query):
+    """Посты выборки, в которых есть все слова запроса."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        query = fts_query(query)
+    if not query:
+        return queryset.none()
+    return queryset.filter(search_entry__body__match=query)
+
+
+def _score(query, vendor):
+    if vendor == 'sqlite':
+        # bm25 тем меньше, чем лучше совпадение; меняем знак, чтобы
+        # сортировка по убыванию шла от лучших результатов.
+        return RawSQL(f'-bm25("{TABLE}")', (), output_field=FloatField())
+    return RawSQL(
+        f"ts_rank_cd(\"{TABLE}\".\"body\", plainto_tsquery('russian', %s))",
+        (query,), output_field=FloatField())
+
+
+def search_posts(query):
+    """Найденные посты, лучшие совпадения первыми.
+
+    Сортировка (score, id) подходит для KeysetPaginator.
+    """
+    posts = Post.objects.feed()
+    vendor = connections[posts.db].vendor
+    return (matching(posts, query)
+            .annotate(score=_score(query, vendor))
+            .order_by('-score', '-id'))
@@ -0,0 +1,169 @@
+import threading
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import caching, counters, freshness, notifications, search, timeline
+from .tasks import defer
+from .models import Comment, Follow, Group, Post, User
+
+# Посты, которые удаляются в этом потоке: их комментарии уходят каскадом.
+_deleting = threading.local()
+
+# Поля пользователя, которые видны на страницах.
+DISPLAYED_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+@receiver(post_save, sender=Post)
+def update_feeds_on_save(sender, instance, created, **kwargs):
+    defer(search.index_post, instance.pk)
+    scopes = caching.post_scopes(instance.author_id, instance.group_id)
+    if created:
+        caching.adjust_feed_counts(scopes, 1)
+        caching.bump_generations(scopes)
+        freshness.touch(scopes + [caching.post_scope(instance.pk)])
+        counters.adjust_user_stats(instance.author_id, posts_count=1)
+        defer(timeline.fan_out, instance.pk)
+        defer(notifications.collect, instance.pk)
+        return
+    old_group_id = getattr(instance, '_loaded_group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        if old_group_id is not None:
+            old_group = caching.group_scope(old_group_id)
+            caching.adjust_feed_counts([old_group], -1)
+            scopes.append(old_group)
+        if instance.group_id is not None:
+            caching.adjust_feed_counts(
+                [caching.group_scope(instance.group_id)], 1)
+        instance._loaded_group_id = instance.group_id
+    caching.bump_generations(scopes)
+    freshness.touch(scopes + [caching.post_scope(instance.pk)])
+
+
+@receiver(pre_delete, sender=Post)
+def mark_post_deleting(sender, instance, **kwargs):
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def update_feeds_on_delete(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+    search.remove_post(instance.pk)
+    scopes = caching.post_scopes(instance.author_id, instance.group_id)
+    caching.adjust_feed_counts(scopes, -1)
+    caching.bump_generations(scopes)
+    freshness.touch(scopes)
+    freshness.forget([caching.post_scope(instance.pk)])
+    counters.adjust_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def update_feeds_on_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_comments_count(instance.post_id, 1)
+    _bump_comment_feeds(instance)
+
+
+@receiver(pre_delete, sender=Comment)
+def mark_comment_cascade(sender, instance, **kwargs):
+    # pre_delete приходят всем удаляемым объектам до первого DELETE, и
+    # пост, удаляемый вместе с комментариями, уже отмечен. post_delete
+    # комментариев может прийти и после post_delete поста, поэтому
+    # отметка переносится на сам комментарий.
+    instance._post_deleting = instance.post_id in _deleting_posts()
+
+
+@receiver(post_delete, sender=Comment)
+def update_feeds_on_comment_delete(sender, instance, **kwargs):
+    # При удалении поста его ленты сдвинет обработчик самого поста, а
+    # счётчик комментариев удаляется вместе со строкой.
+    if getattr(instance, '_post_deleting', False):
+        return
+    counters.adjust_comments_count(instance.post_id, -1)
+    _bump_comment_feeds(instance)
+
+
+def _bump_comment_feeds(comment):
+    # Число комментариев выводится в карточке поста в каждой его ленте.
+    post = (Post.objects.filter(pk=comment.post_id)
+            .values_list('author_id', 'group_id').first())
+    if post is not None:
+        scopes = caching.post_scopes(*post)
+        caching.bump_generations(scopes)
+        freshness.touch(scopes + [caching.post_scope(comment.post_id)])
+
+
+@receiver(post_save, sender=Follow)
+def update_follow_on_save(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_user_stats(instance.user_id, following_count=1)
+        counters.adjust_user_stats(instance.author_id, followers_count=1)
+        _follow_changed(instance)
+        defer(timeline.backfill, instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def update_follow_on_delete(sender, instance, **kwargs):
+    counters.adjust_user_stats(instance.user_id, following_count=-1)
+    counters.adjust_user_stats(instance.author_id, followers_count=-1)
+    _follow_changed(instance)
+    defer(timeline.prune, instance.user_id, instance.author_id)
+
+
+def _follow_changed(follow):
+    # Число подписчиков и кнопка подписки — на странице автора, число
+    # подписок — на странице подписчика.
+    scopes = [caching.author_scope(follow.author_id),
+              caching.author_scope(follow.user_id)]
+    caching.bump_generations(scopes)
+    freshness.touch(scopes)
+
+
+@receiver(post_save, sender=Group)
+def update_group_freshness(sender, instance, created, **kwargs):
+    # Название и описание группы — в шапке её ленты, название и адрес —
+    # в карточках её постов в общей ленте и в профилях их авторов.
+    scopes = [caching.group_scope(instance.pk)]
+    if not created:
+        author_ids = (Post.objects.filter(group_id=instance.pk).order_by()
+                      .values_list('author_id', flat=True).distinct())
+        scopes.append(caching.ALL_POSTS)
+        scopes += [caching.author_scope(author_id)
+                   for author_id in author_ids]
+        caching.bump_generations(scopes)
+    freshness.touch(scopes)
+
+
+@receiver(pre_save, sender=User)
+def check_displayed_user_fields(sender, instance, update_fields, **kwargs):
+    # Вход сохраняет только last_login, а его нигде не видно.
+    instance._displayed_changed = False
+    if instance._state.adding or update_fields is not None and (
+            update_fields.isdisjoint(DISPLAYED_USER_FIELDS)):
+        return
+    old = (User.objects.filter(pk=instance.pk)
+           .values_list(*DISPLAYED_USER_FIELDS).first())
+    instance._displayed_changed = old != tuple(
+        getattr(instance, field) for field in DISPLAYED_USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def update_author_freshness(sender, instance, created, **kwargs):
+    if created or not getattr(instance, '_displayed_changed', False):
+        return
+    # Имя автора — в шапке профиля и в карточках его постов во всех
+    # лентах, где они есть.
+    group_ids = (Post.objects.filter(author_id=instance.pk)
+                 .exclude(group=None).order_by()
+                 .values_list('group_id', flat=True).distinct())
+    scopes = [caching.ALL_POSTS, caching.author_scope(instance.pk)]
+    scopes += [caching.group_scope(group_id) for group_id in group_ids]
+    caching.bump_generations(scopes)
+    freshness.touch(scopes)
@@ -0,0 +1,131 @@
+"""Стеммер для русского языка (алгоритм Портера из проекта Snowball).
+
+Нужен полнотекстовому индексу SQLite: FTS5 не знает русской морфологии,
+поэтому в индекс и в запрос попадают уже обрезанные основы слов.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом',
+     'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья',
+     'я'),
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _remove(rv, endings):
+    """Отрезает самое длинное из окончаний или возвращает None.
+
+    Окончания первой группы отрезаются, только если перед ними а или я.
+    """
+    preceded, plain = endings
+    found = max(
+        (ending for ending in preceded + plain if rv.endswith(ending)),
+        key=len, default=None)
+    if found is None:
+        return None
+    stem = rv[:-len(found)]
+    if found in plain:
+        return stem
+    if stem.endswith(('а', 'я')):
+        return stem
+    return None
+
+
+def _r2_start(word):
+    """Начало области R2: после второй пары «гласная — согласная»."""
+    pairs = 0
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            pairs += 1
+            if pairs == 2:
+                return i + 1
+    return len(word)
+
+
+def _step_endings(rv):
+    """Шаг 1: окончание деепричастия, прилагательного, глагола или имени.
+
+    Если это не деепричастие, сначала отрезается возвратная частица.
+    """
+    result = _remove(rv, PERFECTIVE_GERUND)
+    if result is not None:
+        return result
+    rv = _remove(rv, REFLEXIVE) or rv
+    result = _remove(rv, ADJECTIVE)
+    if result is not None:
+        return _remove(result, PARTICIPLE) or result
+    result = _remove(rv, VERB)
+    if result is None:
+        result = _remove(rv, NOUN)
+    return rv if result is None else result
+
+
+def _step_derivational(rv, r2):
+    """Шаг 3: словообразовательный суффикс в области R2."""
+    for ending in DERIVATIONAL:
+        if rv.endswith(ending) and len(rv) - len(ending) >= r2:
+            return rv[:-len(ending)]
+    return rv
+
+
+def _step_superlative(rv):
+    """Шаг 4: двойное н, превосходная степень или мягкий знак."""
+    if rv.endswith('нн'):
+        return rv[:-1]
+    for ending in SUPERLATIVE:
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            return rv[:-1] if rv.endswith('нн') else rv
+    if rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    first_vowel = next(
+        (i for i, ch in enumerate(word) if ch in VOWELS), None)
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+    rv = _step_endings(rv)
+    # Шаг 2.
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    rv = _step_derivational(rv, _r2_start(word) - len(prefix))
+    return prefix + _step_superlative(rv)
+
+
+def stems(text):
+    """Основы всех слов текста по порядку."""
+    return [stem(word) for word in WORD_RE.findall(text)]
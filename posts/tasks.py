@@ -0,0 +1,75 @@
+"""Фоновое выполнение побочной работы вне запроса.
+
+При POSTS_JOB_QUEUE задачи пишутся в таблицу Job и выполняются
+воркером manage.py run_worker (posts.jobs). Без очереди работа идёт
+в пуле потоков процесса после коммита или прямо в запросе.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POSTS_BACKGROUND_WORKERS,
+            thread_name_prefix='posts-background')
+    return _executor
+
+
+def _call(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         func.__name__)
+
+
+def _run(func, args):
+    try:
+        _call(func, args)
+    finally:
+        close_old_connections()
+
+
+def run_in_background(func, *args):
+    """Запускает func(*args) в пуле потоков после коммита транзакции.
+
+    При POSTS_BACKGROUND_WORKERS = 0 задача выполняется сразу после
+    коммита в текущем потоке. Ошибка задачи в обоих случаях только
+    пишется в лог и не доходит до запроса. С очередью задача уходит
+    воркеру.
+    """
+    if settings.POSTS_JOB_QUEUE:
+        jobs.enqueue(func, *args)
+        return
+
+    def submit():
+        if settings.POSTS_BACKGROUND_WORKERS:
+            _get_executor().submit(_run, func, args)
+        else:
+            _call(func, args)
+
+    transaction.on_commit(submit)
+
+
+def defer(func, *args):
+    """Вызывает func(*args) сразу или, если включена очередь, в воркере.
+
+    Для работы, которую без очереди выполняет сам запрос: раскладка
+    поста по лентам, индексация и т. п. Аргументы — то, что сохранится
+    в JSON (обычно id).
+    """
+    if settings.POSTS_JOB_QUEUE:
+        jobs.enqueue(func, *args)
+    else:
+        func(*args)
@@ -0,0 +1,129 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from posts import thumbnails
+from posts.caching import card_key, get_or_compute
+from posts.metrics import record_cache
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/post_item.html'
+EDIT_BUTTON_TEMPLATE = 'posts/post_edit_button.html'
+# Места в закэшированной карточке, которые зависят от зрителя и от
+# положения карточки на странице.
+LAZY_SLOT = '<!--lazy-->'
+EDIT_SLOT = '<!--edit-->'
+
+
+@register.filter
+def page_window(page, on_each_side=2):
+    """Номера страниц вокруг текущей, первая и последняя.
+
+    Пропуски обозначаются None, чтобы не выводить ссылку на каждую
+    страницу большой ленты.
+    """
+    num_pages = page.paginator.num_pages
+    number = page.number
+    window = set(range(max(number - on_each_side, 1),
+                       min(number + on_each_side, num_pages) + 1))
+    window.update((1, num_pages))
+    result = []
+    previous = 0
+    for i in sorted(window):
+        if i - previous > 1:
+            result.append(None)
+        result.append(i)
+        previous = i
+    return result
+
+
+class PostCardsNode(template.Node):
+    def __init__(self, posts):
+        self.posts = posts
+
+    def render(self, context):
+        posts = list(self.posts.resolve(context))
+        keys = [card_key(post) for post in posts]
+        cards = cache.get_many(keys)
+        record_cache(True, len(cards))
+        missing = [(key, post) for key, post in zip(keys, posts)
+                   if key not in cards]
+        record_cache(False, len(missing))
+        if missing:
+            thumbnails.resolve([post for _, post in missing])
+            rendered = self.render_cards(context, missing)
+            cache.set_many(rendered, settings.POSTS_FEED_CACHE_TIMEOUT)
+            cards.update(rendered)
+        engine = context.template.engine
+        user = context.get('user')
+        bits = []
+        for number, (key, post) in enumerate(zip(keys, posts)):
+            edit = ''
+            if user is not None and user == post.author:
+                edit = engine.get_template(EDIT_BUTTON_TEMPLATE).render(
+                    context.new({'post': post}))
+            bits.append(cards[key]
+                        .replace(LAZY_SLOT, 'loading="lazy"' if number else '')
+                        .replace(EDIT_SLOT, edit))
+        return ''.join(bits)
+
+    def render_cards(self, context, posts):
+        card = context.template.engine.get_template(CARD_TEMPLATE)
+        rendered = {}
+        # Один слой контекста и одно состояние рендера на все карточки
+        # вместо {% include ... with %} на каждую.
+        with context.render_context.push_state(card), \
+                context.push(card_slots=True):
+            for key, post in posts:
+                context['post'] = post
+                rendered[key] = card._render(context)
+        return rendered
+
+
+@register.tag
+def post_cards(parser, token):
+    """Карточки постов: {% post_cards page %}.
+
+    HTML карточек общий для всех зрителей и берётся из кэша одним
+    get_many по ключу версии поста (posts.caching.card_key); заново
+    рендерятся только отсутствующие, с одним слоем контекста на все.
+    Кнопка редактирования для автора и ленивая загрузка картинок всех
+    карточек, кроме первой, подставляются в готовый HTML.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires exactly one argument.")
+    return PostCardsNode(parser.compile_filter(bits[1]))
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, key):
+        self.nodelist = nodelist
+        self.key = key
+
+    def render(self, context):
+        page_key = self.key.resolve(context)
+        if page_key is None:
+            return self.nodelist.render(context)
+        return get_or_compute(
+            page_key.key, lambda: self.nodelist.render(context),
+            settings.POSTS_FEED_CACHE_TIMEOUT, page_key.stale_key)
+
+
+@register.tag
+def feedcache(parser, token):
+    """Кэширует фрагмент ленты под ключом из контекста.
+
+    {% feedcache feed_cache_key %} ... {% endfeedcache %}
+    Если ключ равен None, фрагмент рендерится без кэша. Пока один воркер
+    рендерит фрагмент заново, остальные отдают предыдущую копию.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires exactly one argument.")
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    return FeedCacheNode(nodelist, parser.compile_filter(bits[1]))
@@ -0,0 +1,66 @@
+"""Помощники тестов: бюджет SQL-запросов на один запрос к странице.
+
+Лишний запрос обычно появляется незаметно — шаблон обращается к
+ленивой связи в цикле. Бюджет ловит такие изменения, а отчёт при его
+превышении показывает сами запросы, чтобы не искать их отладчиком.
+"""
+import difflib
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .querylog import fingerprint
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def capture(client, url, method='get', data=None):
+    """SQL-запросы обращения к url при пустом кэше.
+
+    Сначала делается прогон вхолостую: разовая работа первого обращения
+    (например, подсчёт счётчиков пользователя) в бюджет не входит.
+    """
+    getattr(client, method)(url, data or {})
+    cache.clear()
+    with CaptureQueriesContext(connection) as captured:
+        getattr(client, method)(url, data or {})
+    return [query['sql'] for query in captured.captured_queries]
+
+
+def format_queries(queries):
+    """Нумерованный список; повторы одного шаблона помечены числом."""
+    counts = Counter(fingerprint(sql) for sql in queries)
+    lines = []
+    for number, sql in enumerate(queries, 1):
+        repeats = counts[fingerprint(sql)]
+        mark = f'  [×{repeats}]' if repeats > 1 else ''
+        lines.append(f'{number:>3}. {sql}{mark}')
+    return '\n'.join(lines)
+
+
+def diff_queries(before, after, before_label='before', after_label='after'):
+    """Разница двух наборов запросов по шаблонам, в формате unified diff."""
+    return '\n'.join(difflib.unified_diff(
+        [fingerprint(sql) for sql in before],
+        [fingerprint(sql) for sql in after],
+        before_label, after_label, lineterm=''))
+
+
+def check_budget(queries, budget, label):
+    if len(queries) > budget:
+        raise QueryBudgetExceeded(
+            f'{label}: {len(queries)} SQL-запросов при бюджете {budget}\n'
+            + format_queries(queries))
+
+
+def check_constant(small, large, label, small_label, large_label):
+    """Число запросов не должно зависеть от числа постов на странице."""
+    if len(small) != len(large):
+        raise QueryBudgetExceeded(
+            f'{label}: {len(small)} запросов при {small_label} и '
+            f'{len(large)} при {large_label}\n'
+            + diff_queries(small, large, small_label, large_label))
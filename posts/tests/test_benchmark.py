@@ -0,0 +1,87 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts import benchmark
+from posts.datagen import Generator, username
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+
+class GeneratorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def generator(self, **kwargs):
+        params = dict(users=50, groups=3, posts=60, comments=40,
+                      follows=200, images=0, seed=7)
+        params.update(kwargs)
+        return Generator(**params)
+
+    def test_rows_are_deterministic(self):
+        first, second = self.generator(), self.generator()
+        self.assertEqual(list(first.post_rows()), list(second.post_rows()))
+        self.assertEqual(list(first.follow_rows()),
+                         list(second.follow_rows()))
+        other = self.generator(seed=8)
+        self.assertNotEqual(list(first.post_rows()), list(other.post_rows()))
+
+    def test_followers_follow_power_law(self):
+        authors = Counter(row['author']
+                          for row in self.generator().follow_rows())
+        top = authors.most_common(1)[0]
+        self.assertEqual(top[0], username(0))
+        self.assertGreater(top[1], 200 * 0.15)
+
+    def test_run_creates_consistent_data(self):
+        self.generator().run()
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(Post.objects.filter(author_id=follow.author_id).count()
+                for follow in Follow.objects.all()))
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 95), 95)
+        self.assertEqual(benchmark.percentile([3], 95), 3)
+
+    def test_compare(self):
+        base = {'index': {'p50_ms': 10, 'p95_ms': 20, 'queries': 3,
+                          'bytes': 100}}
+        same = {'index': dict(base['index'], p95_ms=24)}
+        self.assertEqual(benchmark.compare(same, base), [])
+        slower = {'index': dict(base['index'], p95_ms=40)}
+        self.assertEqual(len(benchmark.compare(slower, base)), 1)
+        more_queries = {'index': dict(base['index'], queries=4)}
+        self.assertEqual(len(benchmark.compare(more_queries, base)), 1)
+        self.assertEqual(benchmark.compare({'new': base['index']}, base), [])
+
+    def test_run_measures_every_view(self):
+        cache.clear()
+        Generator(users=20, groups=2, posts=30, comments=10, follows=40,
+                  images=0).run()
+        results = benchmark.run(repeat=2)
+        self.assertEqual(
+            set(results),
+            {'index', 'index_deep', 'group_posts', 'profile', 'post_view',
+             'follow_index'})
+        for result in results.values():
+            self.assertGreater(result['bytes'], 0)
+
+    def test_render_cards_tag_matches_include(self):
+        cache.clear()
+        Generator(users=5, groups=1, posts=12, comments=5, follows=5,
+                  images=0).run()
+        results = benchmark.run_render(repeat=3)
+        self.assertEqual(set(results),
+                         {'cards_include', 'cards_tag', 'cards_tag_cold'})
+        for name in ('cards_tag', 'cards_tag_cold'):
+            self.assertEqual(results[name]['bytes'],
+                             results['cards_include']['bytes'])
+        self.assertEqual(results['cards_tag']['queries'], 0)
@@ -0,0 +1,93 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import counters
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.search import search_posts
+
+User = get_user_model()
+
+
+class BulkCommandsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.dir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.author = User.objects.create(username='vlad')
+        self.reader = User.objects.create(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def export(self, kind, name, *args):
+        call_command('export_data', kind, '-o', self.path(name), *args,
+                     stderr=io.StringIO())
+
+    def load(self, kind, name, *args):
+        call_command('import_data', kind, self.path(name), *args,
+                     stdout=io.StringIO())
+
+    def test_round_trip(self):
+        posts = [Post.objects.create(text=f'Пост про море {i}',
+                                     author=self.author, group=self.group)
+                 for i in range(5)]
+        old_date = datetime(2015, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        Post.objects.filter(pk=posts[0].pk).update(pub_date=old_date)
+        Comment.objects.create(post=posts[0], author=self.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        for kind, name in (('posts', 'posts.jsonl'),
+                           ('comments', 'comments.csv'),
+                           ('follows', 'follows.jsonl')):
+            self.export(kind, name, '--format', name.rsplit('.', 1)[1])
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+
+        self.load('posts', 'posts.jsonl', '--batch-size', '2')
+        self.load('comments', 'comments.csv')
+        self.load('follows', 'follows.jsonl')
+
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Post.objects.get(pk=posts[0].pk).pub_date, old_date)
+        self.assertEqual(Post.objects.get(pk=posts[0].pk).comments_count, 1)
+        self.assertEqual(Post.objects.filter(group=self.group).count(), 5)
+        self.assertEqual(counters.stats_for(self.author).posts_count, 5)
+        self.assertEqual(counters.stats_for(self.author).followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5)
+        self.assertEqual(len(search_posts('море')), 5)
+
+    def test_import_reports_progress(self):
+        with open(self.path('posts.jsonl'), 'w') as stream:
+            for i in range(3):
+                stream.write(f'{{"text": "Пост {i}", "author": "vlad"}}\n')
+        out = io.StringIO()
+        call_command('import_data', 'posts', self.path('posts.jsonl'),
+                     '--batch-size', '2', stdout=out)
+        self.assertIn('Загружено: 2', out.getvalue())
+        self.assertIn('Загружено: 3', out.getvalue())
+        self.assertEqual(len(search_posts('пост')), 3)
+
+    def test_missing_users(self):
+        with open(self.path('follows.csv'), 'w') as stream:
+            stream.write('user,author\nnewbie,vlad\n')
+        with self.assertRaises(CommandError):
+            self.load('follows', 'follows.csv')
+        self.load('follows', 'follows.csv', '--create-users')
+        self.assertTrue(Follow.objects.filter(
+            user__username='newbie', author=self.author).exists())
+        self.assertFalse(
+            User.objects.get(username='newbie').has_usable_password())
@@ -0,0 +1,123 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.test import TestCase, override_settings
+
+from posts.caching import (acquire_lock, bump_generations, generation,
+                           get_feed_count, get_or_compute, release_lock)
+
+
+class GetOrComputeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def lock(self, lock_key):
+        self.assertTrue(acquire_lock(lock_key, 10))
+        self.addCleanup(release_lock, lock_key)
+
+    def compute(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(get_or_compute('key', self.compute, 60),
+                         'значение 1')
+        self.assertEqual(get_or_compute('key', self.compute, 60),
+                         'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_copy_is_served_while_locked(self):
+        """Пока другой воркер считает, отдаётся предыдущая копия"""
+        get_or_compute('old', self.compute, 60, stale_key='latest')
+        self.lock('new:lock')
+        self.assertEqual(
+            get_or_compute('new', self.compute, 60, stale_key='latest'),
+            'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(POSTS_CACHE_LOCK_WAIT=0.1)
+    def test_computes_when_nothing_to_serve(self):
+        self.lock('key:lock')
+        self.assertEqual(get_or_compute('key', self.compute, 60),
+                         'значение 1')
+
+    def test_early_recompute_near_expiry(self):
+        """Незадолго до истечения срока значение пересчитывается заранее"""
+        cache.set('key', ('старое', 10.0, time.time() + 1), 60)
+        with mock.patch('posts.caching.random.random', return_value=0.5):
+            self.assertEqual(get_or_compute('key', self.compute, 60),
+                             'значение 1')
+        self.assertEqual(cache.get('key')[0], 'значение 1')
+
+    def test_early_recompute_is_single(self):
+        cache.set('key', ('старое', 10.0, time.time() + 1), 60)
+        self.lock('key:lock')
+        with mock.patch('posts.caching.random.random', return_value=0.5):
+            self.assertEqual(get_or_compute('key', self.compute, 60),
+                             'старое')
+        self.assertEqual(self.calls, 0)
+
+
+class LockTests(TestCase):
+    def setUp(self):
+        self.addCleanup(release_lock, 'key:lock')
+
+    def test_lock_is_exclusive(self):
+        self.assertTrue(acquire_lock('key:lock', 10))
+        self.assertFalse(acquire_lock('key:lock', 10))
+        release_lock('key:lock')
+        self.assertTrue(acquire_lock('key:lock', 10))
+
+    @skipUnless(isinstance(caches['default'], FileBasedCache),
+                'Срок блокировки в файловом кэше')
+    def test_expired_lock_is_taken_over(self):
+        """Блокировку упавшего воркера по истечении срока берёт другой"""
+        self.assertTrue(acquire_lock('key:lock', 10))
+        with mock.patch('posts.caching.time.time',
+                        return_value=time.time() + 11):
+            self.assertTrue(acquire_lock('key:lock', 10))
+
+
+class GenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @skipUnless(isinstance(caches['default'], FileBasedCache),
+                'Срок ключей в файловом кэше')
+    def test_bumped_generation_does_not_expire(self):
+        generation('all')
+        bump_generations(['all'])
+        value = generation('all')
+        later = time.time() + 24 * 60 * 60
+        with mock.patch('django.core.cache.backends.filebased.time.time',
+                        return_value=later):
+            self.assertEqual(generation('all'), value)
+
+    def test_concurrent_bumps_are_not_lost(self):
+        start = generation('all')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: bump_generations(['all']),
+                              range(20)))
+        self.assertEqual(generation('all'), start + 20)
+
+
+class FeedCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.count = mock.Mock(return_value=3)
+
+    def test_count_is_cached(self):
+        self.assertEqual(get_feed_count('all', self.count), 3)
+        self.assertEqual(get_feed_count('all', self.count), 3)
+        self.count.assert_called_once()
+
+    @override_settings(POSTS_FEED_COUNT_TIMEOUT=0)
+    def test_count_expires(self):
+        """Число постов пересчитывается по истечении срока"""
+        get_feed_count('all', self.count)
+        get_feed_count('all', self.count)
+        self.assertEqual(self.count.call_count, 2)
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='vlad')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Старый текст', author=cls.user,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def page(self, client, url=None):
+        return client.get(url or reverse('profile', args=['vlad']))
+
+    def render(self, user=None):
+        posts = list(Post.objects.feed())
+        return Template('{% load feed_tags %}{% post_cards posts %}').render(
+            Context({'posts': posts, 'user': user}))
+
+    def test_cards_come_from_cache(self):
+        self.assertIn('Старый текст', self.render())
+        # update() в обход save() не меняет версию поста.
+        Post.objects.filter(pk=self.post.pk).update(text='Тайком')
+        self.assertIn('Старый текст', self.render())
+        cache.clear()
+        self.assertIn('Тайком', self.render())
+
+    def test_saved_post_renders_again(self):
+        self.page(self.reader_client)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        response = self.page(self.reader_client)
+        self.assertContains(response, 'Новый текст')
+        self.assertNotContains(response, 'Старый текст')
+
+    def test_concurrent_saves_get_distinct_versions(self):
+        """Правки двух копий поста не получают одну и ту же версию"""
+        first = Post.objects.get(pk=self.post.pk)
+        second = Post.objects.get(pk=self.post.pk)
+        first.save()
+        second.save(update_fields=['text'])
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version, 2)
+
+    def test_comment_count_renders_again(self):
+        self.page(self.reader_client)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        self.assertContains(self.page(self.reader_client), 'Комментариев: 1')
+
+    def test_group_title_renders_again(self):
+        self.render()
+        Group.objects.filter(pk=self.group.pk).update(title='Новая группа')
+        self.assertIn('#Новая группа', self.render())
+
+    def test_edit_button_only_for_author(self):
+        edit_url = reverse('post_edit', args=['vlad', self.post.pk])
+        self.assertNotContains(self.page(self.reader_client), edit_url)
+        self.assertContains(self.page(self.author_client), edit_url)
+        self.assertNotContains(self.page(self.reader_client), edit_url)
+
+    def test_only_first_card_loads_eagerly(self):
+        Post.objects.filter(pk=self.post.pk).update(
+            thumbnail_url='/media/a.jpg', thumbnail_width=960,
+            thumbnail_height=339)
+        Post.objects.create(text='Второй', author=self.user,
+                            thumbnail_url='/media/b.jpg')
+        html = self.render()
+        self.assertEqual(html.count('loading="lazy"'), 1)
+        self.assertLess(html.index('/media/b.jpg'),
+                        html.index('loading="lazy"'))
+
+    def test_no_slots_left_in_page(self):
+        for client in (self.reader_client, self.author_client):
+            response = self.page(client)
+            self.assertNotContains(response, '<!--lazy-->')
+            self.assertNotContains(response, '<!--edit-->')
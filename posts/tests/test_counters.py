@@ -0,0 +1,97 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_views(self):
+        """Счётчики меняются при публикации, комментариях и подписках"""
+        counters.stats_for(self.author)
+        counters.stats_for(self.reader)
+        self.author_client.post(reverse('new_post'), {'text': 'Пост'})
+        post = Post.objects.get()
+        self.reader_client.post(
+            reverse('add_comment', kwargs={'username': 'author',
+                                           'post_id': post.pk}),
+            {'text': 'Коммент'})
+        self.reader_client.get(
+            reverse('profile_follow', kwargs={'username': 'author'}))
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        self.reader_client.get(
+            reverse('profile_unfollow', kwargs={'username': 'author'}))
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_shows_author_counters(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.author_client.get(
+            reverse('profile', kwargs={'username': 'reader'}))
+        self.assertContains(response, 'Подписчиков: 0')
+        self.assertContains(response, 'Подписан: 1')
+
+    def test_profile_posts_count_from_stats(self):
+        counters.stats_for(self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        response = self.reader_client.get(
+            reverse('profile', kwargs={'username': 'author'}))
+        self.assertEqual(response.context['posts_count'], 1)
+
+    def test_post_delete_cost_does_not_depend_on_comments(self):
+        """Каскадное удаление комментариев не пишет по строке на каждый"""
+        counts = []
+        for comments in (1, 5):
+            post = Post.objects.create(text='Пост', author=self.author)
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.reader, text='Комментарий')
+                for _ in range(comments))
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_reconcile_fixes_drift(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Раз')
+        counters.stats_for(self.author)
+        Post.objects.update(comments_count=5)
+        UserStats.objects.update(posts_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertIn('Исправлено счётчиков: 3', out.getvalue())
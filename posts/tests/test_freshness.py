@@ -0,0 +1,166 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import caching, freshness
+from posts.models import Comment, FeedFreshness, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='vlad')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.user,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def urls(self):
+        return {
+            'index': reverse('index'),
+            'group': reverse('group', args=['group']),
+            'profile': reverse('profile', args=['vlad']),
+            'post': reverse('post', args=['vlad', self.post.pk]),
+        }
+
+    def revalidate(self, url, client=None):
+        client = client or self.guest_client
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_not_modified(self):
+        for name, url in self.urls().items():
+            with self.subTest(page=name):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_not_modified_costs_one_query(self):
+        for name, url in self.urls().items():
+            with self.subTest(page=name):
+                etag = self.guest_client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(len(queries), 1)
+
+    def test_last_modified(self):
+        url = reverse('index')
+        last_modified = self.guest_client.get(url)['Last-Modified']
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_post_changes_feeds(self):
+        urls = self.urls()
+        etags = {name: self.guest_client.get(url)['ETag']
+                 for name, url in urls.items()}
+        Post.objects.create(text='Новый', author=self.user, group=self.group)
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(page=name):
+                response = self.guest_client.get(
+                    urls[name], HTTP_IF_NONE_MATCH=etags[name])
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_page(self):
+        url = self.urls()['post']
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Комментарий')
+
+    def test_follow_changes_profile(self):
+        url = self.urls()['profile']
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        url = reverse('index')
+        self.assertNotEqual(self.guest_client.get(url)['ETag'],
+                            self.reader_client.get(url)['ETag'])
+
+    def test_deleted_post_not_revalidated(self):
+        url = self.urls()['post']
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.get(pk=self.post.pk).delete()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_pages(self):
+        FeedFreshness.objects.all().delete()
+        response = self.guest_client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        response = self.guest_client.get(reverse('group', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_changes_follower_profile(self):
+        freshness.touch([caching.author_scope(self.reader.pk)])
+        url = reverse('profile', args=['reader'])
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_rename_changes_feeds(self):
+        urls = self.urls()
+        etags = {name: self.guest_client.get(urls[name])['ETag']
+                 for name in ('index', 'group')}
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'vladislav'
+        user.save()
+        for name, etag in etags.items():
+            with self.subTest(page=name):
+                response = self.guest_client.get(urls[name],
+                                                 HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, '@vladislav')
+
+    def test_group_rename_changes_feeds(self):
+        urls = self.urls()
+        etags = {name: self.guest_client.get(urls[name])['ETag']
+                 for name in ('index', 'group', 'profile')}
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        for name, etag in etags.items():
+            with self.subTest(page=name):
+                response = self.guest_client.get(urls[name],
+                                                 HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Новое название')
+
+    def test_hidden_user_fields_keep_pages_fresh(self):
+        url = self.urls()['index']
+        etag = self.guest_client.get(url)['ETag']
+        user = User.objects.get(pk=self.user.pk)
+        user.email = 'vlad@example.com'
+        user.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_login_keeps_pages_fresh(self):
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('пароль'))
+        url = self.urls()['profile']
+        etag = self.guest_client.get(url)['ETag']
+        self.assertTrue(Client().login(username='vlad', password='пароль'))
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,86 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import images
+from posts.forms import PostForm
+from posts.models import Post
+
+User = get_user_model()
+
+EXIF_ORIENTATION = 0x0112
+
+
+def make_jpeg(size, orientation=None):
+    image = Image.new('RGB', size, 'red')
+    buffer = io.BytesIO()
+    params = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        params['exif'] = exif.tobytes()
+    image.save(buffer, 'JPEG', **params)
+    return buffer.getvalue()
+
+
+@override_settings(POSTS_IMAGE_PROCESSES=0, POSTS_IMAGE_MAX_SIDE=100)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create(username='vlad')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, content, name='photo.jpg'):
+        return Post.objects.create(
+            text='Текст', author=self.user,
+            image=SimpleUploadedFile(name=name, content=content,
+                                     content_type='image/jpeg'))
+
+    def test_ingest_shrinks_and_strips_exif(self):
+        # Ориентация 6: снимок повёрнут на 90°, после разворота он станет
+        # вертикальным.
+        post = self.create_post(make_jpeg((400, 200), orientation=6))
+        original = post.image.name
+        images.ingest(post.pk)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertFalse(post.image.storage.exists(original))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn('exif', image.info)
+            self.assertTrue(image.info.get('progressive'))
+        self.assertTrue(post.thumbnail_url)
+
+    def test_ingest_converts_to_configured_format(self):
+        post = self.create_post(make_jpeg((20, 10)))
+        with self.settings(POSTS_IMAGE_FORMAT='WEBP'):
+            images.ingest(post.pk)
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.endswith('.webp'))
+        self.assertEqual((post.image_width, post.image_height), (20, 10))
+
+    @override_settings(POSTS_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_form_rejects_large_upload(self):
+        upload = SimpleUploadedFile(
+            name='big.jpg', content=make_jpeg((800, 800)) + b'\0' * 2048,
+            content_type='image/jpeg')
+        form = PostForm(data={'text': 'Текст'}, files={'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import jobs, notifications, search, timeline
+from posts.models import Follow, Job, Post, TimelineEntry
+
+User = get_user_model()
+
+calls = []
+
+
+def remember(*args):
+    calls.append(args)
+
+
+def explode(*args):
+    raise RuntimeError('сломалось')
+
+
+@override_settings(POSTS_JOB_QUEUE=True, POSTS_JOB_RETRY_DELAY=10,
+                   POSTS_JOB_MAX_ATTEMPTS=2)
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='vlad')
+        cls.reader = User.objects.create(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+        self.worker = jobs.Worker(threads=1, batch_size=10)
+
+    def test_new_post_side_effects_wait_for_worker(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.worker.run(until_empty=True)
+        client = Client()
+        client.force_login(self.author)
+        client.post(reverse('new_post'), {'text': 'Пост для очереди'})
+        post = Post.objects.get()
+        self.assertEqual(
+            set(Job.objects.values_list('task', flat=True)),
+            {jobs.task_name(timeline.fan_out),
+             jobs.task_name(search.index_post),
+             jobs.task_name(notifications.collect)})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.assertEqual(self.worker.run_once(), (3, 0))
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(list(search.search_posts('очереди')), [post])
+
+    def test_batches(self):
+        for i in range(15):
+            jobs.enqueue(remember, i)
+        self.assertEqual(self.worker.run_once(), (10, 0))
+        self.assertEqual(self.worker.run_once(), (5, 0))
+        self.assertEqual(sorted(calls), [(i,) for i in range(15)])
+
+    def test_delayed_and_locked_jobs_wait(self):
+        jobs.enqueue(remember, 1, delay=60)
+        locked = jobs.enqueue(remember, 2)
+        Job.objects.filter(pk=locked.pk).update(
+            locked_by='other',
+            locked_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(jobs.claim(10), [])
+        Job.objects.filter(pk=locked.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim(10), [Job.objects.get(pk=locked.pk)])
+
+    def test_failed_job_retried_then_kept(self):
+        job = jobs.enqueue(explode, 1)
+        with self.assertLogs('posts.jobs', 'WARNING'):
+            self.assertEqual(self.worker.run_once(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('сломалось', job.last_error)
+        self.assertGreater(job.run_after,
+                           timezone.now() + timedelta(seconds=5))
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('posts.jobs', 'ERROR'):
+            self.worker.run_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(jobs.claim(10), [])
+
+    def test_run_worker_command(self):
+        jobs.enqueue(remember, 'a')
+        with mock.patch('signal.signal'):
+            call_command('run_worker', '--threads', '1', '--until-empty',
+                         stdout=mock.Mock())
+        self.assertEqual(calls, [('a',)])
+        self.assertFalse(Job.objects.exists())
+
+
+class WithoutQueueTests(TestCase):
+    def test_side_effects_run_in_request(self):
+        author = User.objects.create(username='vlad')
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(text='Пост', author=author)
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post=post).exists())
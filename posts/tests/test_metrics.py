@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+MIDDLEWARE = ['posts.middleware.PerformanceMiddleware',
+              *settings.MIDDLEWARE]
+
+
+@override_settings(MIDDLEWARE=MIDDLEWARE, POSTS_METRICS_TOKEN='секрет')
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='vlad')
+        Post.objects.create(text='Первый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.guest_client = Client()
+        self.metrics_client = Client(HTTP_AUTHORIZATION='Bearer секрет')
+
+    def test_server_timing_header(self):
+        response = self.guest_client.get(reverse('index'))
+        timing = response['Server-Timing']
+        for name in ('total;dur=', 'db;dur=', 'tpl;dur=', 'cache;desc='):
+            self.assertIn(name, timing)
+        self.assertNotIn('db;dur=0.0;desc="0 queries"', timing)
+
+    def test_histograms_per_view(self):
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('profile', args=['vlad']))
+        text = self.metrics_client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="index"} 2', text)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="profile"} 1', text)
+        self.assertIn('yatube_db_queries_bucket{view="index",le="+Inf"} 2',
+                      text)
+        self.assertIn('# TYPE yatube_template_duration_seconds histogram',
+                      text)
+
+    def test_cache_hits_and_misses(self):
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        text = metrics.exposition()
+        self.assertRegex(
+            text, r'yatube_cache_requests_total'
+                  r'\{view="index",result="hit"\} [1-9]')
+        self.assertRegex(
+            text, r'yatube_cache_requests_total'
+                  r'\{view="index",result="miss"\} [1-9]')
+
+    def test_unresolved_requests(self):
+        self.guest_client.get('/no/such/page/here/')
+        self.assertIn('{view="unresolved"}', metrics.exposition())
+
+    def test_exposition_content_type(self):
+        response = self.metrics_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_exposition_hidden_without_access(self):
+        """Запрос с 127.0.0.1 (как через прокси) метрик не получает"""
+        wrong_token = Client(HTTP_AUTHORIZATION='Bearer другой')
+        for client in (self.guest_client, wrong_token):
+            response = client.get(reverse('metrics'))
+            self.assertEqual(response.status_code, 404)
+        with self.settings(POSTS_METRICS_TOKEN=''):
+            response = Client(HTTP_AUTHORIZATION='Bearer ').get(
+                reverse('metrics'))
+            self.assertEqual(response.status_code, 404)
+
+    def test_exposition_for_staff_and_allowed_addresses(self):
+        staff_client = Client()
+        staff_client.force_login(
+            User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(staff_client.get(reverse('metrics')).status_code,
+                         200)
+        with self.settings(POSTS_METRICS_ALLOWED_IPS=['127.0.0.1']):
+            response = self.guest_client.get(reverse('metrics'))
+            self.assertEqual(response.status_code, 200)
+
+    def test_stats_only_inside_request(self):
+        self.guest_client.get(reverse('index'))
+        self.assertIsNone(metrics.current())
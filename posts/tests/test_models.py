@@ -1,7 +1,10 @@
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 
-from posts.models import Group, Post
+from posts.models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -51,3 +54,43 @@ class ModelTest(TestCase):
 
     def test_only_15_symbols(self):
         self.assertEqual(len(self.post.__str__()), 15)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса в формате SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='vlad')
+        cls.group = Group.objects.create(title='Группа', slug='plan-slug')
+        cls.post = Post.objects.create(text='Текст', author=cls.user,
+                                       group=cls.group)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index_name}', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_feeds_use_indexes(self):
+        """Ленты читаются по индексу, без сортировки всей таблицы"""
+        feeds = {
+            'post_pub_date_idx': Post.objects.feed(),
+            'post_group_pub_date_idx': self.group.posts.feed(),
+            'post_author_pub_date_idx': self.user.posts.feed(),
+        }
+        for index_name, queryset in feeds.items():
+            with self.subTest(index=index_name):
+                self.assertUsesIndex(queryset[:10], index_name)
+                self.assertUsesIndex(
+                    queryset.order_by('-pub_date', '-pk')[:10], index_name)
+
+    def test_comments_use_index(self):
+        self.assertUsesIndex(self.post.comments.all(),
+                             'comment_post_created_idx')
+
+    def test_follow_is_unique(self):
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=reader, author=self.user)
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import notifications
+from posts.models import Follow, Notification, Post
+
+User = get_user_model()
+
+
+class CountingBackend(EmailBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened = 0
+        self.batches = []
+
+    def open(self):
+        self.opened += 1
+
+    def send_messages(self, messages):
+        self.batches.append(len(messages))
+        return super().send_messages(messages)
+
+
+class BrokenBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+@override_settings(POSTS_DIGEST_RATE=0, POSTS_DIGEST_MAX_POSTS=3,
+                   POSTS_SITE_URL='https://yatube.example')
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='vlad')
+        cls.readers = [
+            User.objects.create(username=f'reader{i}',
+                                email=f'reader{i}@example.com')
+            for i in range(5)
+        ]
+        cls.silent = User.objects.create(username='silent')
+        for user in cls.readers + [cls.silent]:
+            Follow.objects.create(user=user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_post_collected_for_followers_with_email(self):
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            set(Notification.objects.filter(post=post)
+                .values_list('user', flat=True)),
+            {user.pk for user in self.readers})
+
+    def test_one_digest_per_follower(self):
+        first = Post.objects.create(text='Первый пост', author=self.author)
+        second = Post.objects.create(text='Второй пост', author=self.author)
+        self.assertEqual(notifications.send_digests(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         [user.email for user in self.readers])
+        body = mail.outbox[0].body
+        self.assertIn('Первый пост', body)
+        self.assertIn('Второй пост', body)
+        self.assertLess(body.index('Второй пост'), body.index('Первый пост'))
+        self.assertIn(f'https://yatube.example/vlad/{first.pk}/', body)
+        self.assertIn(f'https://yatube.example/vlad/{second.pk}/', body)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(notifications.send_digests(), 0)
+
+    def test_long_digest_is_cut(self):
+        for i in range(5):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        notifications.send_digests()
+        self.assertIn('И ещё постов: 2', mail.outbox[0].body)
+
+    def test_batches_share_one_connection(self):
+        Post.objects.create(text='Пост', author=self.author)
+        connection = CountingBackend()
+        notifications.send_digests(batch_size=2, connection=connection)
+        self.assertEqual(connection.opened, 1)
+        self.assertEqual(connection.batches, [2, 2, 1])
+
+    def test_rate_limit(self):
+        Post.objects.create(text='Пост', author=self.author)
+        with mock.patch('posts.notifications.time.sleep') as sleep:
+            notifications.send_digests(batch_size=2, rate=1)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertGreater(sleep.call_args_list[0].args[0], 1)
+
+    def test_failed_batch_kept_for_next_run(self):
+        Post.objects.create(text='Пост', author=self.author)
+        with self.assertRaises(ConnectionError):
+            notifications.send_digests(connection=BrokenBackend())
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_command(self):
+        Post.objects.create(text='Пост', author=self.author)
+        call_command('send_digests', stdout=mock.Mock())
+        self.assertEqual(len(mail.outbox), 5)
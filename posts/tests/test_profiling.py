@@ -0,0 +1,139 @@
+import marshal
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, ProfileRecord
+
+User = get_user_model()
+
+PROFILE_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(POSTS_PROFILE_ROOT=PROFILE_ROOT,
+                   POSTS_PROFILE_SAMPLE_RATE=0,
+                   POSTS_PROFILE_INTERVAL=0.001)
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(username='admin', is_staff=True,
+                                        is_superuser=True)
+        cls.user = User.objects.create(username='vlad')
+        cls.clerk = User.objects.create(username='clerk', is_staff=True)
+        Post.objects.create(text='Пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(PROFILE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+
+    def test_staff_flag_profiles_request(self):
+        response = self.staff_client.get(reverse('index'), {'profile': '1'})
+        record = ProfileRecord.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(record.pk))
+        self.assertEqual(record.view_name, 'index')
+        self.assertEqual(record.trigger, 'request')
+        self.assertEqual(record.user, self.staff)
+        self.assertGreater(record.duration_ms, 0)
+        with record.stats_file.open('rb') as stream:
+            stats = marshal.load(stream)
+        self.assertTrue(any(name == 'index' for _, _, name in stats))
+
+    def test_query_string_not_stored(self):
+        self.staff_client.get(reverse('index'),
+                              {'profile': '1', 'token': 'секрет'})
+        self.assertEqual(ProfileRecord.objects.get().path, reverse('index'))
+
+    def test_header_flag(self):
+        self.staff_client.get(reverse('index'), HTTP_X_PROFILE='1')
+        self.assertEqual(ProfileRecord.objects.count(), 1)
+
+    def test_collapsed_stacks(self):
+        self.staff_client.get(reverse('index'), {'profile': '1'})
+        record = ProfileRecord.objects.get()
+        with record.stacks_file.open('rb') as stream:
+            lines = stream.read().decode().splitlines()
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertIn(':', stack)
+
+    def test_flag_ignored_for_regular_users(self):
+        response = self.user_client.get(reverse('index'), {'profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(ProfileRecord.objects.exists())
+
+    @override_settings(POSTS_PROFILE_SAMPLE_RATE=1)
+    def test_sampling(self):
+        Client().get(reverse('index'))
+        record = ProfileRecord.objects.get()
+        self.assertEqual(record.trigger, 'sample')
+        self.assertIsNone(record.user)
+
+    @override_settings(POSTS_PROFILE_SAMPLE_RATE=1)
+    def test_sampled_profile_id_shown_only_to_staff(self):
+        self.assertNotIn('X-Profile-Id', Client().get(reverse('index')))
+        self.assertNotIn('X-Profile-Id',
+                         self.user_client.get(reverse('index')))
+        self.assertIn('X-Profile-Id',
+                      self.staff_client.get(reverse('index')))
+
+    def test_admin_shows_summary_and_files(self):
+        self.staff_client.get(reverse('index'), {'profile': '1'})
+        record = ProfileRecord.objects.get()
+        response = self.staff_client.get(reverse(
+            'admin:posts_profilerecord_change', args=[record.pk]))
+        self.assertContains(response, 'cumulative')
+        download = self.staff_client.get(reverse(
+            'admin:posts_profilerecord_download', args=[record.pk, 'stacks']))
+        self.assertEqual(download.status_code, 200)
+        missing = self.staff_client.get(reverse(
+            'admin:posts_profilerecord_download', args=[record.pk, 'other']))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_download_requires_view_permission(self):
+        """Сотрудник без прав на профили не скачивает файлы"""
+        self.staff_client.get(reverse('index'), {'profile': '1'})
+        record = ProfileRecord.objects.get()
+        clerk_client = Client()
+        clerk_client.force_login(self.clerk)
+        response = clerk_client.get(reverse(
+            'admin:posts_profilerecord_download', args=[record.pk, 'stats']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_missing_files(self):
+        """Удалённые с диска файлы не ломают админку"""
+        self.staff_client.get(reverse('index'), {'profile': '1'})
+        record = ProfileRecord.objects.get()
+        record.stats_file.storage.delete(record.stats_file.name)
+        response = self.staff_client.get(reverse(
+            'admin:posts_profilerecord_change', args=[record.pk]))
+        self.assertContains(response, 'Файл профиля не найден')
+        download = self.staff_client.get(reverse(
+            'admin:posts_profilerecord_download', args=[record.pk, 'stats']))
+        self.assertEqual(download.status_code, 404)
+
+    def test_bulk_delete_removes_files(self):
+        self.staff_client.get(reverse('index'), {'profile': '1'})
+        record = ProfileRecord.objects.get()
+        storage = record.stats_file.storage
+        names = [record.stats_file.name, record.stacks_file.name]
+        self.staff_client.post(
+            reverse('admin:posts_profilerecord_changelist'),
+            {'action': 'delete_selected', '_selected_action': [record.pk],
+             'post': 'yes'})
+        self.assertFalse(ProfileRecord.objects.exists())
+        for name in names:
+            self.assertFalse(storage.exists(name))
@@ -0,0 +1,139 @@
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.template import Context, Template
+from django.urls import reverse
+
+from posts import querylog
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class FingerprintTests(TestCase):
+    def test_literals_and_in_lists(self):
+        self.assertEqual(
+            querylog.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b IN (?, ?, ?) "
+                "AND c = 15"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?')
+
+    def test_in_lists_of_real_queries(self):
+        """Запросы с pk__in разной длины дают один шаблон"""
+        def captured_sql(pks):
+            queries = []
+
+            def capture(execute, sql, *args):
+                queries.append(sql)
+                return execute(sql, *args)
+
+            with connection.execute_wrapper(capture):
+                list(Post.objects.filter(pk__in=pks))
+            [sql] = queries
+            return querylog.fingerprint(sql)
+
+        two, three = captured_sql([1, 2]), captured_sql([1, 2, 3])
+        self.assertEqual(two, three)
+        self.assertIn('IN (...)', two)
+
+    def test_savepoints(self):
+        self.assertEqual(querylog.fingerprint('SAVEPOINT "s1234_x5"'),
+                         querylog.fingerprint('SAVEPOINT "s99_x1"'))
+
+
+class QueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='vlad')
+        cls.posts = [Post.objects.create(text=f'Пост {i}', author=cls.user)
+                     for i in range(4)]
+
+    def run_queries(self, log, func):
+        with connection.execute_wrapper(log.record_query):
+            func()
+
+    def test_duplicates_point_to_template_line(self):
+        template = Template(
+            '{% for post in posts %}{{ post.author.username }}{% endfor %}')
+        posts = list(Post.objects.all())
+        log = querylog.QueryLog(slow_ms=10 ** 6, duplicate_limit=3)
+        self.run_queries(log, lambda: template.render(
+            Context({'posts': posts})))
+        [(sql, count)] = log.duplicates()
+        self.assertEqual(count, 4)
+        self.assertIn('auth_user', sql)
+        code, line = log.origins[sql]
+        self.assertEqual(line, '<unknown source>:1')
+
+    def test_duplicates_below_limit_ignored(self):
+        log = querylog.QueryLog(slow_ms=10 ** 6, duplicate_limit=5)
+        self.run_queries(log, lambda: [post.author for post in
+                                       Post.objects.all()])
+        self.assertEqual(log.duplicates(), [])
+
+    def test_slow_queries_with_origin(self):
+        log = querylog.QueryLog(slow_ms=0, duplicate_limit=100)
+        self.run_queries(log, lambda: list(Post.objects.all()))
+        [(sql, duration, (code, template))] = log.slow
+        self.assertIn('posts_post', sql)
+        self.assertGreaterEqual(duration, 0)
+        self.assertTrue(code.startswith('posts/tests/test_querylog.py:'))
+        self.assertIsNone(template)
+
+    def test_report(self):
+        log = querylog.QueryLog(slow_ms=0, duplicate_limit=2)
+        self.run_queries(log, lambda: [post.author for post in
+                                       Post.objects.all()])
+        with self.assertLogs('posts.querylog', 'WARNING') as logs:
+            log.report('index')
+        events = [record.event for record in logs.records]
+        self.assertIn('slow_query', events)
+        self.assertIn('duplicate_query', events)
+        self.assertTrue(all(record.view == 'index'
+                            for record in logs.records))
+
+
+class JsonFormatterTests(TestCase):
+    def test_extra_fields(self):
+        record = logging.makeLogRecord({
+            'name': 'posts.querylog', 'levelname': 'WARNING',
+            'msg': 'Медленный SQL-запрос', 'event': 'slow_query',
+            'duration_ms': 120.5})
+        data = json.loads(querylog.JsonFormatter().format(record))
+        self.assertEqual(data['message'], 'Медленный SQL-запрос')
+        self.assertEqual(data['event'], 'slow_query')
+        self.assertEqual(data['duration_ms'], 120.5)
+        self.assertNotIn('args', data)
+
+
+@override_settings(POSTS_DUPLICATE_QUERY_LIMIT=2, POSTS_SLOW_QUERY_MS=10 ** 6)
+class QueryLogMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='vlad')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for i in range(3):
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_has_no_duplicates(self):
+        with self.assertLogs('posts.querylog', 'WARNING') as logs:
+            Client().get(reverse('index'))
+            # assertLogs требует хотя бы одну запись
+            querylog.logger.warning('конец')
+        self.assertEqual([record.getMessage() for record in logs.records],
+                         ['конец'])
+
+    def test_duplicates_logged_with_view(self):
+        with override_settings(POSTS_DUPLICATE_QUERY_LIMIT=1), \
+                self.assertLogs('posts.querylog', 'WARNING') as logs:
+            Client().get(reverse('post', args=['vlad', self.post.pk]))
+        self.assertTrue(all(record.view == 'post'
+                            for record in logs.records))
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+from posts.stemmer import stem
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        self.assertEqual(stem('котики'), stem('котиков'))
+        self.assertEqual(stem('бегали'), stem('бегающий'))
+        self.assertEqual(stem('Ёлки'), stem('елка'))
+
+    def test_stems(self):
+        self.assertEqual(stem('возможность'), 'возможн')
+        self.assertEqual(stem('красивейшая'), 'красив')
+        self.assertEqual(stem('django'), 'django')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='vlad')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def create_post(self, text):
+        return Post.objects.create(text=text, author=self.user)
+
+    def search(self, query, **params):
+        response = self.guest_client.get(reverse('search'),
+                                         {'q': query, **params})
+        return response, [post.pk for post in response.context['page']]
+
+    def test_finds_word_forms(self):
+        post = self.create_post('Сегодня видел котиков во дворе')
+        self.create_post('Про собак')
+        _, found = self.search('котик')
+        self.assertEqual(found, [post.pk])
+
+    def test_all_words_required_and_best_first(self):
+        weak = self.create_post('Кошка ' + 'слово ' * 30 + 'собака')
+        strong = self.create_post('Кошка и собака')
+        self.create_post('Только кошка')
+        _, found = self.search('кошки собаки')
+        self.assertEqual(found, [strong.pk, weak.pk])
+
+    def test_index_follows_edit_and_delete(self):
+        post = self.create_post('Старый текст')
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.search('старый')[1], [])
+        self.assertEqual(self.search('новый')[1], [post.pk])
+        post.delete()
+        self.assertEqual(self.search('новый')[1], [])
+
+    def test_empty_query(self):
+        response = self.guest_client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['page'])
+        self.assertEqual(self.search('!!!')[1], [])
+
+    @override_settings(POSTS_PER_PAGE=2)
+    def test_keyset_pages(self):
+        posts = [self.create_post(f'Пост про море {i}') for i in range(5)]
+        response, first = self.search('море')
+        self.assertContains(response, 'q=%D0%BC%D0%BE%D1%80%D0%B5&amp;after=')
+        cursor = response.context['page'].next_cursor
+        _, second = self.search('море', after=cursor)
+        self.assertEqual(len(first + second), 4)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(set(first + second) - {p.pk for p in posts}, set())
+
+    def test_rebuild(self):
+        post = self.create_post('Текст про горы')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.search('горы')[1], [])
+        search.rebuild()
+        self.assertEqual(self.search('горы')[1], [post.pk])
+
+    def test_admin_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        post = self.create_post('Админ ищет котиков')
+        self.create_post('Другой пост')
+        self.guest_client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'котик'})
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        sql = ' '.join(q['sql'] for q in queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
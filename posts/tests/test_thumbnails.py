@@ -0,0 +1,157 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create(username='vlad')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.post = Post.objects.create(
+            text='Текст',
+            author=self.user,
+            image=SimpleUploadedFile(name='small.gif', content=SMALL_GIF,
+                                     content_type='image/gif'),
+        )
+
+    def test_generate_stores_thumbnail(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail_url.startswith(settings.MEDIA_URL))
+        self.assertEqual(
+            (self.post.thumbnail_width, self.post.thumbnail_height),
+            (960, 339))
+
+    def test_generate_stores_variants_and_placeholder(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        widths = [entry.rsplit(' ', 1)[1]
+                  for entry in self.post.thumbnail_srcset.split(', ')]
+        self.assertEqual(widths, ['320w', '640w', '960w', '1920w'])
+        self.assertTrue(self.post.thumbnail_placeholder.startswith(
+            'data:image/jpeg;base64,'))
+
+    def test_variants_skip_upscaling_known_small_image(self):
+        Post.objects.filter(pk=self.post.pk).update(image_width=700)
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertNotIn('1920w', self.post.thumbnail_srcset)
+        self.assertIn('960w', self.post.thumbnail_srcset)
+
+    def test_feed_uses_stored_thumbnail(self):
+        """Лента выводит готовую миниатюру без обращения к sorl"""
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, self.post.thumbnail_url)
+        self.assertContains(response, 'srcset="')
+        kvstore_queries = [q['sql'] for q in queries
+                           if 'thumbnail_kvstore' in q['sql']]
+        self.assertEqual(kvstore_queries, [])
+
+    def test_feed_falls_back_to_original_image(self):
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, self.post.image.url)
+
+    def test_reset_clears_thumbnail(self):
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        thumbnails.reset(self.post)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail_url, '')
+        self.assertIsNone(self.post.thumbnail_width)
+
+
+class ResolveThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create(username='vlad')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.posts = [
+            Post.objects.create(
+                text=f'Текст {i}',
+                author=self.user,
+                image=SimpleUploadedFile(name=f'small{i}.gif',
+                                         content=SMALL_GIF,
+                                         content_type='image/gif'),
+            )
+            for i in range(3)
+        ]
+
+    def kvstore_queries(self, queries):
+        return [q['sql'] for q in queries if 'thumbnail_kvstore' in q['sql']]
+
+    def test_page_thumbnails_resolved_in_one_query(self):
+        """Миниатюры sorl для всей страницы находятся одним запросом"""
+        urls = [get_thumbnail(post.image, thumbnails.CARD_GEOMETRY,
+                              **thumbnails.CARD_OPTIONS).url
+                for post in self.posts]
+        cache.clear()
+        with mock.patch('posts.thumbnails.run_in_background') as run:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.guest_client.get(reverse('index'))
+        for url in urls:
+            self.assertContains(response, url)
+        self.assertEqual(len(self.kvstore_queries(queries)), 1)
+        run.assert_not_called()
+
+    def test_missing_thumbnails_are_scheduled_once(self):
+        with mock.patch('posts.thumbnails.run_in_background') as run:
+            self.guest_client.get(reverse('index'))
+            thumbnails.resolve(Post.objects.all())
+        self.assertEqual(
+            sorted(call.args[1] for call in run.call_args_list),
+            sorted(post.pk for post in self.posts))
+
+    def test_stored_thumbnails_skip_lookup(self):
+        for post in self.posts:
+            thumbnails.generate(post.pk)
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.resolve(Post.objects.all())
+        self.assertEqual(self.kvstore_queries(queries), [])
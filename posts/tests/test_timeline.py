@@ -0,0 +1,105 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+from posts.timeline import timeline_posts
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.other = User.objects.create(username='other')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow_page(self):
+        response = self.client.get(reverse('follow_index'))
+        return list(response.context['page'].object_list)
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка её чистит"""
+        self.client.get(reverse('profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.follow_page(), [self.old_post])
+
+        self.client.get(reverse('profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.follow_page(), [])
+
+    def test_backfill_after_unfollow_leaves_no_entries(self):
+        """Запоздавшее заполнение не оставляет постов отписанного автора"""
+        timeline.backfill(self.reader.pk, self.author.pk)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    @override_settings(POSTS_JOB_QUEUE=True)
+    def test_unfollow_during_backfill_leaves_no_entries(self):
+        """Отписка посреди заполнения не оставляет постов в ленте"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        insert = timeline._insert
+
+        def insert_and_unfollow(entries):
+            # prune отписки уходит в очередь и вставленных строк не видит.
+            insert(entries)
+            follow.delete()
+
+        with mock.patch('posts.timeline._insert', insert_and_unfollow):
+            timeline.backfill(self.reader.pk, self.author.pk)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    def test_new_post_is_fanned_out(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            set(post.timeline_entries.values_list('user', flat=True)),
+            {self.reader.pk, self.other.pk})
+        self.assertEqual(self.follow_page(), [post, self.old_post])
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора подмешиваются при чтении"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        cache.clear()
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(post.timeline_entries.exists())
+        self.assertEqual(self.follow_page(), [post, self.old_post])
+
+    @override_settings(POSTS_TIMELINE_FANOUT_LIMIT=1)
+    def test_author_stays_pulled_below_limit(self):
+        """Посты, не разложенные по лентам, не пропадают после отписок"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        cache.clear()
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        Follow.objects.filter(user=self.other).delete()
+        cache.clear()
+        self.assertEqual(self.follow_page(), [post, self.old_post])
+
+    @skipUnless(connection.vendor == 'sqlite', 'План запроса в формате SQLite')
+    def test_timeline_uses_index(self):
+        plan = timeline_posts(self.reader)[:10].explain()
+        self.assertIn('USING COVERING INDEX timeline_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
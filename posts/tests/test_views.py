@@ -1,3 +1,4 @@
+import base64
 import shutil
 import tempfile
 
@@ -7,10 +8,13 @@ from django.contrib.auth import get_user_model
 from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.paginator import Page, Paginator
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
+from posts.templatetags.feed_tags import page_window
 
 User = get_user_model()
 
@@ -181,17 +185,80 @@ class ViewsTests(TestCase):
         self.assertEqual(post_quantity, 10)
 
     def test_cache_index_page(self):
-        response_1 = self.authorized_client.get(reverse('index'))
+        """Лента для гостя кэшируется до создания или правки поста"""
+        response_1 = self.guest_client.get(reverse('index'))
+        # update() не посылает сигналов — страница остаётся в кэше
+        Post.objects.filter(pk=Post.objects.first().pk).update(text='Hi')
+        response_2 = self.guest_client.get(reverse('index'))
+        self.assertEqual(response_1.content, response_2.content)
         Post.objects.create(
             text='Hi',
             author=self.user
         )
-        response_2 = self.authorized_client.get(reverse('index'))
-        self.assertEqual(response_1.content, response_2.content)
-        self.my_cache.clear()
-        response_3 = self.authorized_client.get(reverse('index'))
+        response_3 = self.guest_client.get(reverse('index'))
         self.assertNotEqual(response_2.content, response_3.content)
 
+    def test_cache_key_depends_on_page(self):
+        """Вторая страница не отдаётся из кэша первой"""
+        response_1 = self.guest_client.get(reverse('index'))
+        response_2 = self.guest_client.get(reverse('index'), {'page': 2})
+        self.assertNotEqual(response_1.content, response_2.content)
+        self.assertContains(response_2, f'name="post_{self.post.pk}"')
+
+    def test_cache_key_uses_resolved_page(self):
+        """Разные записи одной страницы делят одну копию в кэше"""
+        def key(params):
+            response = self.guest_client.get(reverse('index'), params)
+            return response.context['feed_cache_key']
+
+        first = key({})
+        for page in ('1', '01', 'abc'):
+            with self.subTest(page=page):
+                self.assertEqual(key({'page': page}), first)
+        last = key({'page': '2'})
+        self.assertEqual(key({'page': '999'}), last)
+        self.assertEqual(key({'page': '-1'}), last)
+        self.assertNotEqual(last, first)
+
+    def test_post_edit_invalidates_cache(self):
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        post = Post.objects.first()
+        post.text = 'Отредактированный текст'
+        post.save()
+        self.assertContains(self.guest_client.get(url),
+                            'Отредактированный текст')
+
+    def test_cached_feed_keeps_author_buttons(self):
+        """Кнопка редактирования не попадает в общий кэш ленты"""
+        self.guest_client.get(reverse('index'))
+        self.assertContains(self.authorized_client.get(reverse('index')),
+                            'Редактировать')
+        self.assertNotContains(
+            self.authorized_client_2.get(reverse('index')), 'Редактировать')
+
+    def test_comment_invalidates_cache(self):
+        """Новый комментарий сразу виден в счётчике на карточке"""
+        post = Post.objects.first()
+        self.guest_client.get(reverse('index'))
+        self.authorized_client_2.post(
+            reverse('add_comment', kwargs={'username': self.user.username,
+                                           'post_id': post.pk}),
+            {'text': 'Коммент'})
+        self.assertContains(self.guest_client.get(reverse('index')),
+                            'Комментариев: 1')
+        self.assertContains(self.authorized_client.get(reverse('index')),
+                            'Комментариев: 1')
+
+    def test_feed_rows_are_cached(self):
+        """Посты страницы берутся из кэша, пока лента не изменилась"""
+        self.authorized_client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('index'))
+        post_queries = [q['sql'] for q in queries
+                        if 'FROM "posts_post"' in q['sql']]
+        self.assertEqual(post_queries, [])
+
     def test_follow_authorized(self):
         """Авторизованный пользователь может подписываться"""
         self.authorized_client_2.get(reverse(
@@ -239,3 +306,190 @@ class ViewsTests(TestCase):
         object = response.context.get('page').object_list
         self.assertEqual(len(object), 1)
         self.assertEqual(object[0].text, 'ABC')
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='feed-slug',
+            description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        posts = [Post(text=f'Пост {i}', group=cls.group, author=cls.user)
+                 for i in range(13)]
+        Post.objects.bulk_create(posts)
+        for post in Post.objects.all():
+            Comment.objects.create(post=post, author=cls.reader,
+                                   text='Коммент')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        caches['default'].clear()
+
+    def count_queries(self, url, page):
+        # Первый запрос создаёт счётчики автора — разовая работа.
+        self.client.get(url, {'page': page})
+        caches['default'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page': page})
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от количества постов"""
+        urls = [
+            reverse('index'),
+            reverse('group', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url, 1),
+                                 self.count_queries(url, 2))
+
+    def test_feed_shows_comments_count(self):
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1', count=10)
+
+
+@override_settings(POSTS_PAGINATION='keyset')
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(25))
+
+    def setUp(self):
+        self.guest_client = Client()
+        caches['default'].clear()
+
+    def walk(self, url):
+        seen = []
+        response = self.guest_client.get(url)
+        while True:
+            page = response.context['page']
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                return seen, page
+            response = self.guest_client.get(url, {'after': page.next_cursor})
+
+    def test_after_cursor_walks_whole_feed(self):
+        """Курсор проходит всю ленту без повторов и пропусков"""
+        seen, _ = self.walk(reverse('index'))
+        expected = list(Post.objects.order_by('-pub_date', '-pk')
+                        .values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.guest_client.get(reverse('index'), {'after': '!!'})
+        self.assertFalse(response.context['page'].has_previous())
+        self.assertEqual(len(response.context['page']), 10)
+
+    def test_cursor_of_wrong_type_shows_first_page(self):
+        for raw in ('1.5|3', 'nan|1', 'inf|1', '2024-13-45T00:00:00|1'):
+            token = base64.urlsafe_b64encode(raw.encode()).decode()
+            for name in ('after', 'before'):
+                with self.subTest(cursor=raw, param=name):
+                    response = self.guest_client.get(reverse('index'),
+                                                     {name: token})
+                    self.assertEqual(response.status_code, 200)
+                    page = response.context['page']
+                    self.assertFalse(page.has_previous())
+                    self.assertEqual(len(page), 10)
+
+    def test_before_cursor_returns_previous_page(self):
+        first = self.guest_client.get(reverse('index'))
+        second = self.guest_client.get(
+            reverse('index'),
+            {'after': first.context['page'].next_cursor})
+        back = self.guest_client.get(
+            reverse('index'),
+            {'before': second.context['page'].previous_cursor})
+        self.assertEqual(list(back.context['page']),
+                         list(first.context['page']))
+        self.assertFalse(back.context['page'].has_previous())
+
+    def test_keyset_page_does_not_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(
+                reverse('profile', kwargs={'username': self.user.username}))
+        offset_queries = [q['sql'] for q in queries if 'OFFSET' in q['sql']]
+        self.assertEqual(offset_queries, [])
+        self.assertTrue(any('LIMIT 11' in q['sql'] for q in queries))
+
+
+class FeedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='count-slug',
+            description='Описание'
+        )
+        cls.group_2 = Group.objects.create(
+            title='Вторая группа',
+            slug='count-slug-2',
+            description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(15))
+
+    def setUp(self):
+        self.guest_client = Client()
+        caches['default'].clear()
+
+    def paginator_count(self, url):
+        return self.guest_client.get(url).context['paginator'].count
+
+    def test_count_is_cached(self):
+        url = reverse('group', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        count_queries = [q['sql'] for q in queries
+                         if q['sql'].startswith('SELECT COUNT(*)')]
+        self.assertEqual(count_queries, [])
+
+    def test_count_follows_create_edit_and_delete(self):
+        index = reverse('index')
+        group = reverse('group', kwargs={'slug': self.group.slug})
+        group_2 = reverse('group', kwargs={'slug': self.group_2.slug})
+        self.assertEqual(self.paginator_count(index), 15)
+        self.assertEqual(self.paginator_count(group), 15)
+        self.assertEqual(self.paginator_count(group_2), 0)
+
+        post = Post.objects.create(text='Новый', author=self.user,
+                                   group=self.group)
+        self.assertEqual(self.paginator_count(index), 16)
+        self.assertEqual(self.paginator_count(group), 16)
+
+        post = Post.objects.get(pk=post.pk)
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(self.paginator_count(group), 15)
+        self.assertEqual(self.paginator_count(group_2), 1)
+
+        post.delete()
+        self.assertEqual(self.paginator_count(index), 15)
+        self.assertEqual(self.paginator_count(group_2), 0)
+
+    def test_page_window(self):
+        paginator = Paginator(range(200), 10)
+        self.assertEqual(page_window(paginator.page(1)),
+                         [1, 2, 3, None, 20])
+        self.assertEqual(page_window(paginator.page(10)),
+                         [1, None, 8, 9, 10, 11, 12, None, 20])
+        self.assertEqual(page_window(paginator.page(20)),
+                         [1, None, 18, 19, 20])
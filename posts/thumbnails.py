@@ -0,0 +1,162 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Карточка ленты выводит сохранённый в посте адрес миниатюры и не
+обращается к Pillow и хранилищу sorl-thumbnail во время рендера.
+"""
+import base64
+
+from django.core.cache import cache
+from django.db.models import F
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (EMPTY_VALUE,
+                                                       KVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import caching, freshness
+from .metrics import record_cache
+from .models import Post
+from .tasks import run_in_background
+
+# Пост, уже поставленный на построение миниатюр, не ставится повторно.
+PENDING_TIMEOUT = 600
+
+CARD_WIDTH, CARD_HEIGHT = 960, 339
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+# Ширины вариантов для srcset; CARD_WIDTH строится всегда и служит src.
+CARD_WIDTHS = (320, 640, 960, 1920)
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_OPTIONS = {'crop': 'center', 'upscale': True, 'blur': 1,
+                       'format': 'JPEG', 'quality': 40}
+
+
+def card_geometry(width):
+    return f'{width}x{round(width * CARD_HEIGHT / CARD_WIDTH)}'
+
+
+CARD_GEOMETRY = card_geometry(CARD_WIDTH)
+
+
+def card_widths(post):
+    """Ширины вариантов, которые не растягивают исходную картинку."""
+    return [width for width in CARD_WIDTHS
+            if width == CARD_WIDTH or post.image_width is None
+            or width <= post.image_width]
+
+
+def placeholder(image):
+    """Крошечная размытая копия в виде data URI для показа до загрузки."""
+    thumbnail = get_thumbnail(image, card_geometry(PLACEHOLDER_WIDTH),
+                              **PLACEHOLDER_OPTIONS)
+    data = base64.b64encode(thumbnail.read()).decode()
+    return f'data:image/jpeg;base64,{data}'
+
+
+def generate(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    variants = {width: get_thumbnail(post.image, card_geometry(width),
+                                     **CARD_OPTIONS)
+                for width in card_widths(post)}
+    thumbnail = variants[CARD_WIDTH]
+    # Картинку могли заменить, пока строилась миниатюра.
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnail_url=thumbnail.url,
+        thumbnail_width=thumbnail.width,
+        thumbnail_height=thumbnail.height,
+        thumbnail_srcset=', '.join(
+            f'{variant.url} {variant.width}w'
+            for variant in variants.values()),
+        thumbnail_placeholder=placeholder(post.image),
+        version=F('version') + 1,
+    )
+    if updated:
+        scopes = caching.post_scopes(post.author_id, post.group_id)
+        caching.bump_generations(scopes)
+        freshness.touch(scopes + [caching.post_scope(post.pk)])
+
+
+def reset(post):
+    """Сбрасывает миниатюру сохранённого поста перед построением новой.
+
+    До готовности новой миниатюры карточка показывает исходную картинку.
+    """
+    if post.thumbnail_url:
+        fields = {'thumbnail_url': '', 'thumbnail_width': None,
+                  'thumbnail_height': None, 'thumbnail_srcset': '',
+                  'thumbnail_placeholder': ''}
+        Post.objects.filter(pk=post.pk).update(
+            version=F('version') + 1, **fields)
+        for name, value in fields.items():
+            setattr(post, name, value)
+        post.version += 1
+
+
+def _card_thumbnail(image):
+    """Файл миниатюры карточки, как его назовёт sorl, без обращения к KV.
+
+    Повторяет подготовку опций из ThumbnailBackend.get_thumbnail: от них
+    зависит имя файла, а значит и ключ в хранилище sorl.
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(CARD_OPTIONS)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, CARD_GEOMETRY, options)
+    return ImageFile(name, default.storage)
+
+
+def _lookup(keys):
+    """Значения из хранилища sorl: один get_many и один запрос к БД."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    record_cache(True, len(found))
+    record_cache(False, len(missing))
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(key__in=missing)
+                    .values_list('key', 'value'))
+        rows.update((key, EMPTY_VALUE) for key in missing if key not in rows)
+        kvstore.cache.set_many(
+            rows, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(rows)
+    return {key: value for key, value in found.items()
+            if value is not None and value != EMPTY_VALUE}
+
+
+def resolve(posts):
+    """Подставляет миниатюры постам страницы, у которых их нет в БД.
+
+    Миниатюры, уже построенные sorl, ищутся сразу для всей страницы.
+    Посты, для которых их нет, выводятся с исходной картинкой и ставятся
+    на построение в фоне.
+    """
+    pending = {}
+    for post in posts:
+        if post.image and not post.thumbnail_url:
+            pending[add_prefix(_card_thumbnail(post.image).key)] = post
+    if not pending:
+        return
+    found = _lookup(list(pending))
+    for key, post in pending.items():
+        if key in found:
+            thumbnail = deserialize_image_file(found[key])
+            post.thumbnail_url = thumbnail.url
+            post.thumbnail_width = thumbnail.width
+            post.thumbnail_height = thumbnail.height
+        elif cache.add(f'thumbnails:pending:{post.pk}', True,
+                       PENDING_TIMEOUT):
+            run_in_background(generate, post.pk)
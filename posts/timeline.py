@@ -0,0 +1,146 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается по лентам подписчиков автора, подписка
+заполняет ленту старыми постами автора, отписка — вычищает их.
+Посты авторов с огромным числом подписчиков не раскладываются,
+а подмешиваются при чтении (fan-out on read). Такой автор помечается
+флагом UserStats.timeline_pulled и остаётся «тяжёлым» навсегда.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from . import counters
+from .metrics import record_cache
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+
+
+def pull_author_ids():
+    """Авторы, чьи посты читаются из таблицы постов, а не из лент."""
+    author_ids = cache.get(PULL_AUTHORS_KEY)
+    record_cache(author_ids is not None)
+    if author_ids is None:
+        author_ids = set(UserStats.objects.filter(timeline_pulled=True)
+                         .values_list('user_id', flat=True))
+        cache.set(PULL_AUTHORS_KEY, author_ids,
+                  settings.POSTS_TIMELINE_PULL_AUTHORS_TIMEOUT)
+    return author_ids
+
+
+def _insert(entries):
+    batch_size = settings.POSTS_TIMELINE_BATCH_SIZE
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _mark_pulled(author_id):
+    counters.stats_for(User.objects.get(pk=author_id))
+    UserStats.objects.filter(user_id=author_id).update(timeline_pulled=True)
+    cache.delete(PULL_AUTHORS_KEY)
+
+
+def fan_out(post_id):
+    """Добавляет пост в ленты всех подписчиков автора.
+
+    Если подписчиков больше POSTS_TIMELINE_FANOUT_LIMIT, автор
+    помечается «тяжёлым», и пост остаётся только в таблице постов.
+    """
+    post = (Post.objects.filter(pk=post_id)
+            .only('author_id', 'pub_date').first())
+    if post is None or post.author_id in pull_author_ids():
+        return
+    limit = settings.POSTS_TIMELINE_FANOUT_LIMIT
+    followers = list(Follow.objects.filter(author_id=post.author_id)
+                     .values_list('user_id', flat=True)[:limit + 1])
+    if len(followers) > limit:
+        _mark_pulled(post.author_id)
+        return
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту пользователя постами нового автора подписки.
+
+    Задача может выполниться позже отписки и её prune. Поэтому после
+    вставки в той же транзакции проверяется, что подписка ещё есть;
+    если нет — вставленное удаляется.
+    """
+    if author_id in pull_author_ids():
+        return
+    follow = Follow.objects.filter(user_id=user_id, author_id=author_id)
+    posts = (Post.objects.filter(author_id=author_id).order_by()
+             .values_list('pk', 'pub_date'))
+    with transaction.atomic():
+        _insert(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        )
+        if not follow.exists():
+            prune(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора, от которого отписался."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def rebuild():
+    """Заполняет все ленты подписок заново одним INSERT ... SELECT.
+
+    Нужна после массовой загрузки, которая обходит сигналы.
+    """
+    TimelineEntry.objects.all().delete()
+    cache.delete(PULL_AUTHORS_KEY)
+    pulled = sorted(pull_author_ids())
+    ops = connection.ops
+    entries, follows, posts = (
+        ops.quote_name(model._meta.db_table)
+        for model in (TimelineEntry, Follow, Post))
+    where = ''
+    if pulled:
+        where = 'WHERE f.author_id NOT IN ({})'.format(
+            ', '.join(['%s'] * len(pulled)))
+    sql = (f'{ops.insert_statement(ignore_conflicts=True)} {entries} '
+           f'(user_id, post_id, author_id, pub_date) '
+           f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+           f'FROM {follows} f INNER JOIN {posts} p '
+           f'ON p.author_id = f.author_id {where} '
+           f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, pulled)
+
+
+def timeline_posts(user):
+    """Лента подписок пользователя в виде выборки постов.
+
+    Если среди авторов подписки нет «тяжёлых», это один проход по
+    индексу (user, pub_date) таблицы лент.
+    """
+    posts = Post.objects.feed()
+    pull_ids = pull_author_ids()
+    pulled = []
+    if pull_ids:
+        pulled = list(Follow.objects.filter(user=user, author_id__in=pull_ids)
+                      .values_list('author_id', flat=True))
+    if pulled:
+        pushed = TimelineEntry.objects.filter(user=user).values('post')
+        return posts.filter(Q(pk__in=pushed) | Q(author_id__in=pulled))
+    return posts.filter(timeline_entries__user=user).annotate(
+        timeline_date=F('timeline_entries__pub_date'),
+        timeline_post=F('timeline_entries__post'),
+    ).order_by('-timeline_date', '-timeline_post')
@@ -7,6 +7,8 @@ urlpatterns = [
     path("new/", views.new_post, name="new_post"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search, name="search"),
+    path("metrics/", views.metrics_view, name="metrics"),
     # Профайл пользователя
     path('<str:username>/', views.profile, name='profile'),
     # Просмотр записи
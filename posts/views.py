@@ -1,10 +1,18 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.crypto import constant_time_compare
 
+from . import caching, counters, images, metrics
+from .freshness import (conditional, group_scopes, index_scopes,
+                        post_scopes, profile_scopes)
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post
+from .paginators import KeysetPaginator, page_token, paginate
+from .search import search_posts
+from .timeline import timeline_posts
 
 User = get_user_model()
 
@@ -16,67 +24,90 @@ def new_post(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        images.schedule(post)
         return redirect('index')
     return render(request, 'posts/new_post.html',
                   {'form': form, "is_edit": False})
 
 
+@conditional(index_scopes)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(
-        request,
-        'index.html',
-        {'page': page, 'paginator': paginator}
-    )
+    scope = caching.ALL_POSTS
+    post_list = Post.objects.feed().with_cached_count(scope)
+    paginator, page = paginate(request, post_list, scope)
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'feed_cache_key': caching.feed_cache_key(request, scope,
+                                                 page_token(page)),
+    }
+    return render(request, 'index.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = page = None
+    if query:
+        paginator = KeysetPaginator(search_posts(query),
+                                    settings.POSTS_PER_PAGE)
+        page = paginator.get_page(after=request.GET.get('after'),
+                                  before=request.GET.get('before'))
+    context = {'query': query, 'page': page, 'paginator': paginator}
+    return render(request, 'posts/search.html', context)
 
 
+@conditional(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post = group.posts.all()
-    paginator = Paginator(post, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    scope = caching.group_scope(group.pk)
+    post = group.posts.feed().with_cached_count(scope)
+    paginator, page = paginate(request, post, scope)
     context = {
         'page': page,
         'group': group,
         'post': post,
         'paginator': paginator,
+        'feed_cache_key': caching.feed_cache_key(request, scope,
+                                                 page_token(page)),
     }
     return render(request, 'group.html', context)
 
 
+@conditional(profile_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     following = (request.user.is_authenticated and Follow.objects.filter(
                  author=author, user=request.user).exists())
-    post = author.posts.all()
-    posts_count = post.count()
-    paginator = Paginator(post, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    scope = caching.author_scope(author.pk)
+    post = author.posts.feed().with_cached_count(scope)
+    stats = counters.stats_for(author)
+    paginator, page = paginate(request, post, scope)
     context = {
         "page": page,
         "author": author,
         "posts": post,
-        "posts_count": posts_count,
+        "posts_count": stats.posts_count,
+        "stats": stats,
         "paginator": paginator,
         "following": following,
+        "feed_cache_key": caching.feed_cache_key(request, scope,
+                                                 page_token(page)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_scopes)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    posts_count = post.author.posts.count()
+    post = get_object_or_404(Post.objects.feed(),
+                             author__username=username, id=post_id)
+    stats = counters.stats_for(post.author)
     form = CommentForm()
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         "post": post,
         "author": post.author,
-        "posts_count": posts_count,
+        "posts_count": stats.posts_count,
+        "stats": stats,
         "form": form,
         "comments": comments,
     }
@@ -91,7 +122,9 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            images.schedule(post)
         return redirect('post', username=username, post_id=post_id)
     context = {
         'form': form,
@@ -128,10 +161,8 @@ def server_error(request):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = timeline_posts(request.user)
+    paginator, page = paginate(request, post_list)
     context = {
         'page': page,
         'paginator': paginator,
@@ -152,3 +183,23 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(author=author, user=request.user).delete()
     return redirect('profile', username=username)
+
+
+def _metrics_allowed(request):
+    if request.user.is_staff:
+        return True
+    token = settings.POSTS_METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and constant_time_compare(authorization, f'Bearer {token}'):
+        return True
+    allowed = settings.POSTS_METRICS_ALLOWED_IPS
+    return request.META.get('REMOTE_ADDR') in allowed
+
+
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    if not _metrics_allowed(request):
+        raise Http404
+    return HttpResponse(metrics.exposition(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -1,4 +1,19 @@
+import pytest
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_queries',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    from django.core.cache import cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def run_background_tasks_inline(settings):
+    settings.POSTS_BACKGROUND_WORKERS = 0
+    settings.POSTS_IMAGE_PROCESSES = 0
@@ -0,0 +1,30 @@
+import pytest
+
+SMALL_PAGE = 1
+LARGE_PAGE = 10
+
+
+@pytest.fixture
+def query_budget(settings):
+    """Проверка бюджета SQL-запросов страницы.
+
+    query_budget(client, url, budget) запрашивает url с пустым кэшем и
+    падает, если запросов больше budget. С paged=True страница ещё
+    запрашивается при разном числе постов на странице: число запросов
+    не должно от него зависеть.
+    """
+    from posts.testing import capture, check_budget, check_constant
+
+    def check(client, url, budget, paged=False, method='get', data=None):
+        settings.POSTS_PER_PAGE = LARGE_PAGE
+        large = capture(client, url, method, data)
+        check_budget(large, budget, url)
+        if paged:
+            settings.POSTS_PER_PAGE = SMALL_PAGE
+            small = capture(client, url, method, data)
+            check_constant(small, large, url,
+                           f'{SMALL_PAGE} на странице',
+                           f'{LARGE_PAGE} на странице')
+        return large
+
+    return check
@@ -0,0 +1,105 @@
+import pytest
+from django.urls import URLPattern, get_resolver, reverse
+
+# Бюджет SQL-запросов страницы при пустом кэше. Ленты проверяются ещё и
+# на независимость числа запросов от размера страницы. В бюджет лент и
+# постов входит запрос времени изменения для ETag (posts.freshness).
+BUDGETS = {
+    'index': 4,
+    'group': 5,
+    'profile': 6,
+    'post': 4,
+    'follow_index': 6,
+    'search': 2,
+    'metrics': 0,
+    'new_post': 3,
+    'post_edit': 5,
+    'add_comment': 7,
+    'profile_follow': 5,
+    'profile_unfollow': 5,
+    'signup': 0,
+    'about:author': 0,
+    'about:tech': 0,
+}
+PAGED = {'index', 'group', 'profile', 'follow_index', 'search'}
+URL_MODULES = ('posts.urls', 'users.urls', 'about.urls')
+
+
+def url_names():
+    names = set()
+    for resolver in get_resolver().url_patterns:
+        module = getattr(resolver, 'urlconf_name', None)
+        if getattr(module, '__name__', module) not in URL_MODULES:
+            continue
+        prefix = f'{resolver.namespace}:' if resolver.namespace else ''
+        names.update(prefix + pattern.name
+                     for pattern in resolver.url_patterns
+                     if isinstance(pattern, URLPattern) and pattern.name)
+    return names
+
+
+@pytest.fixture
+def feed(user, group, django_user_model):
+    from posts.models import Comment, Follow, Post
+    reader = django_user_model.objects.create_user(username='reader')
+    posts = [
+        Post.objects.create(text=f'Пост про море {i}', author=user,
+                            group=group, image=f'posts/image_{i}.jpg')
+        for i in range(12)
+    ]
+    for post in posts:
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+    Follow.objects.create(user=reader, author=user)
+    return {'reader': reader, 'posts': posts}
+
+
+def test_every_view_has_budget():
+    assert url_names() == set(BUDGETS), (
+        'Объявите бюджет запросов для новых страниц в BUDGETS')
+
+
+@pytest.mark.django_db
+def test_guest_pages(client, query_budget, feed, user, group, settings):
+    settings.POSTS_METRICS_ALLOWED_IPS = ['127.0.0.1']
+    post = feed['posts'][0]
+    pages = {
+        'index': reverse('index'),
+        'group': reverse('group', args=[group.slug]),
+        'profile': reverse('profile', args=[user.username]),
+        'post': reverse('post', args=[user.username, post.pk]),
+        'search': reverse('search') + '?q=море',
+        'metrics': reverse('metrics'),
+        'signup': reverse('signup'),
+        'about:author': reverse('about:author'),
+        'about:tech': reverse('about:tech'),
+    }
+    for name, url in pages.items():
+        query_budget(client, url, BUDGETS[name], name in PAGED)
+
+
+@pytest.mark.django_db
+def test_user_pages(client, query_budget, feed, user):
+    reader = feed['reader']
+    post = feed['posts'][0]
+    client.force_login(reader)
+    for name, url, method, data in (
+        ('follow_index', reverse('follow_index'), 'get', None),
+        ('new_post', reverse('new_post'), 'get', None),
+        ('add_comment', reverse('add_comment', args=[user.username, post.pk]),
+         'post', {'text': 'Ещё комментарий'}),
+        ('profile_unfollow', reverse('profile_unfollow', args=[user.username]),
+         'get', None),
+        ('profile_follow', reverse('profile_follow', args=[user.username]),
+         'get', None),
+    ):
+        query_budget(client, url, BUDGETS[name], name in PAGED, method, data)
+    client.force_login(user)
+    url = reverse('post_edit', args=[user.username, post.pk])
+    query_budget(client, url, BUDGETS['post_edit'])
+
+
+def test_report_shows_repeated_queries():
+    from posts.testing import QueryBudgetExceeded, check_budget
+    queries = ['SELECT 1 FROM t WHERE id = 1', 'SELECT 1 FROM t WHERE id = 2']
+    with pytest.raises(QueryBudgetExceeded, match=r'\[×2\]'):
+        check_budget(queries, 1, '/')
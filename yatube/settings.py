@@ -11,7 +11,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'c_xueiwvu268qf2$9s^!egs%2@p=+scl+db31%!1y@487p(qn@'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("YATUBE_DEBUG", "1") == "1"
 
 ALLOWED_HOSTS = [
     "localhost",
@@ -42,19 +42,42 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Медленные и повторяющиеся SQL-запросы в лог posts.querylog
+# (JSON в stderr). По умолчанию включено только при DEBUG, задаётся
+# переменной YATUBE_QUERY_LOG=1/0.
+if os.environ.get('YATUBE_QUERY_LOG', '1' if DEBUG else '0') == '1':
+    MIDDLEWARE.insert(0, 'posts.middleware.QueryLogMiddleware')
+# Замеры запросов: заголовок Server-Timing и гистограммы на /metrics/.
+# Включаются переменной окружения YATUBE_METRICS=1.
+if os.environ.get('YATUBE_METRICS') == '1':
+    MIDDLEWARE.insert(0, 'posts.middleware.PerformanceMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+# Без DEBUG шаблоны компилируются один раз на процесс (cached.Loader);
+# при разработке перечитываются с диска, чтобы правки были видны сразу
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Бэкенд Django, который ещё и учитывает время рендера для метрик
+        'BACKEND': 'posts.metrics.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -80,6 +103,29 @@ DATABASES = {
 }
 
 
+# Cache
+# Общий для всех воркеров кэш. По умолчанию файловый; для memcached
+# или другого сервера задайте YATUBE_CACHE_BACKEND и YATUBE_CACHE_LOCATION.
+# Блокировки пересчёта лент (posts.caching.acquire_lock) и поколения лент
+# держатся на cache.add и cache.incr, поэтому у бэкенда они должны быть
+# атомарными и incr не должен менять срок ключа, как у memcached и Redis.
+# У файлового кэша это не так: блокировки для него — отдельные файлы в
+# LOCATION (общей для всех воркеров), поколения сдвигаются под такой
+# блокировкой и пишутся бессрочно, а счётчики постов лент не сдвигаются,
+# а удаляются и пересчитываются при чтении.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'YATUBE_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        'KEY_PREFIX': 'yatube',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -124,6 +170,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся во временный файл на диске по частям, а не в память
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Login
 
 LOGIN_URL = "/auth/login/"
@@ -134,3 +185,102 @@ LOGIN_REDIRECT_URL = "index"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
+
+# Дайджесты новых постов подписчикам (manage.py send_digests): адрес
+# сайта для ссылок, писем за одну отправку через соединение, предел
+# писем в секунду (0 — без предела) и постов в одном письме
+POSTS_SITE_URL = os.environ.get("YATUBE_SITE_URL", "http://localhost:8000")
+POSTS_DIGEST_BATCH_SIZE = 100
+POSTS_DIGEST_RATE = 50
+POSTS_DIGEST_MAX_POSTS = 10
+
+# Лента постов
+
+POSTS_PER_PAGE = 10
+# Сколько секунд хранятся страницы лент. Устаревшие страницы отсекаются
+# поколением ленты при изменении постов и комментариев, поэтому срок
+# может быть долгим
+POSTS_FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько секунд хранится число постов ленты. Его сдвигают сигналы, а
+# массовые изменения в обход сигналов исправит пересчёт по истечении срока
+POSTS_FEED_COUNT_TIMEOUT = 60 * 10
+# Защита от одновременного пересчёта: блокировка на время рендера,
+# ожидание чужого результата и коэффициент досрочного обновления
+POSTS_CACHE_LOCK_TIMEOUT = 10
+POSTS_CACHE_LOCK_WAIT = 0.5
+POSTS_CACHE_EARLY_RECOMPUTE_BETA = 1.0
+# "pages" — нумерованные страницы, "keyset" — курсор ?after=/?before=
+POSTS_PAGINATION = os.environ.get("YATUBE_POSTS_PAGINATION", "pages")
+
+# Лента подписок: посты авторов, у которых подписчиков больше лимита,
+# не раскладываются по лентам, а подмешиваются при чтении
+POSTS_TIMELINE_FANOUT_LIMIT = 10000
+POSTS_TIMELINE_PULL_AUTHORS_TIMEOUT = 600
+POSTS_TIMELINE_BATCH_SIZE = 1000
+
+# Потоки для фоновой работы (миниатюры и т. п.); 0 — выполнять сразу
+# после коммита в потоке запроса
+POSTS_BACKGROUND_WORKERS = int(os.environ.get("YATUBE_BACKGROUND_WORKERS", 2))
+
+# Очередь задач в базе (YATUBE_JOB_QUEUE=1): побочная работа после
+# публикации — ленты подписчиков, индекс поиска, картинки и миниатюры —
+# выполняется воркером manage.py run_worker, а не в процессе сайта.
+# Потоки воркера, размер пачки, пауза опроса очереди и аренда задачи
+# в секундах, число попыток и пауза перед первым повтором
+POSTS_JOB_QUEUE = os.environ.get("YATUBE_JOB_QUEUE") == "1"
+POSTS_JOB_THREADS = 4
+POSTS_JOB_BATCH_SIZE = 20
+POSTS_JOB_POLL_INTERVAL = 1.0
+POSTS_JOB_LEASE = 300
+POSTS_JOB_MAX_ATTEMPTS = 5
+POSTS_JOB_RETRY_DELAY = 10
+
+# Обработка картинок постов: предельный размер загрузки, наибольшая
+# сторона после уменьшения, формат ("JPEG" или "WEBP") и качество;
+# POSTS_IMAGE_PROCESSES — процессы для Pillow, 0 — в текущем процессе
+POSTS_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_SIDE = 1920
+POSTS_IMAGE_FORMAT = "JPEG"
+POSTS_IMAGE_QUALITY = 85
+POSTS_IMAGE_PROCESSES = int(os.environ.get("YATUBE_IMAGE_PROCESSES", 2))
+
+# Доступ к /metrics/: сотрудникам, по заголовку
+# "Authorization: Bearer <YATUBE_METRICS_TOKEN>" и с адресов из списка.
+# Список по умолчанию пуст: за прокси на той же машине все запросы
+# приходят с 127.0.0.1
+POSTS_METRICS_TOKEN = os.environ.get("YATUBE_METRICS_TOKEN", "")
+POSTS_METRICS_ALLOWED_IPS = []
+
+# Порог медленного SQL-запроса в миллисекундах и число повторов одного
+# шаблона запроса за запрос к сайту, после которого он попадает в лог
+POSTS_SLOW_QUERY_MS = int(os.environ.get("YATUBE_SLOW_QUERY_MS", 100))
+POSTS_DUPLICATE_QUERY_LIMIT = 3
+
+# Профилирование запросов: доля случайно профилируемых запросов (0 —
+# только по ?profile=1 от сотрудников), шаг снятия стеков в секундах
+# и каталог для файлов профилей
+POSTS_PROFILE_SAMPLE_RATE = float(
+    os.environ.get("YATUBE_PROFILE_SAMPLE_RATE", 0))
+POSTS_PROFILE_INTERVAL = 0.005
+POSTS_PROFILE_ROOT = os.path.join(BASE_DIR, "profiles")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "posts.querylog.JsonFormatter"},
+    },
+    "handlers": {
+        "json_console": {
+            "class": "logging.StreamHandler",
+            "formatter": "json",
+        },
+    },
+    "loggers": {
+        "posts.querylog": {
+            "handlers": ["json_console"],
+            "level": "WARNING",
+            "propagate": False,
+        },
+    },
+}